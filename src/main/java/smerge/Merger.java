@@ -6,8 +6,12 @@ import smerge.ast.AST;
 import smerge.diff.Differ;
 import smerge.parsers.Parser;
 
+import java.io.BufferedWriter;
+import java.io.FileOutputStream;
 import java.io.IOException;
-import java.io.PrintWriter;
+import java.io.OutputStreamWriter;
+import java.io.Writer;
+import java.nio.charset.StandardCharsets;
 
 /**
  * This class provides the main method to run our tool.
@@ -34,9 +38,10 @@ public class Merger {
         Parser parser = Parser.getInstance(merged);
         
         System.out.println("Parsing merge conflict files...");
-        AST baseTree = parser.parse(base);
-        AST localTree = parser.parse(local);
-        AST remoteTree = parser.parse(remote);        
+        AST[] trees = parser.parseAll(base, local, remote);
+        AST baseTree = trees[0];
+        AST localTree = trees[1];
+        AST remoteTree = trees[2];
         
         // TREE DIFFING
         System.out.println("Generating AST diffs...");
@@ -54,10 +59,11 @@ public class Merger {
         
         // OUTPUT
         System.out.println("Writing result to " + merged);
-        String result = parser.unparse(baseTree);
-        PrintWriter out = new PrintWriter(merged);
-        out.println(result);
-        out.close();
+        // the inputs are decoded as UTF-8, so the result is encoded the same way
+        try (Writer out = new BufferedWriter(new OutputStreamWriter(new FileOutputStream(merged), StandardCharsets.UTF_8))) {
+            parser.unparse(baseTree, out);
+            out.write(System.lineSeparator());
+        }
         System.out.println();
         
         
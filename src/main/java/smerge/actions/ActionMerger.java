@@ -131,8 +131,8 @@ public class ActionMerger {
 		if (type == Type.IMPORT) {
 			mergedNode = mergeImports(null, local, remote);
 			totalConflicts++;
-		} else if (local.getContent().equals(remote.getContent())) {
-			mergedNode = new ASTNode(type, local.getContent(), local.getIndentation());
+		} else if (local.contentEquals(remote)) {
+			mergedNode = new ASTNode(type, local.content(), local.getIndentation());
 			mergedNode.setID(local.getID());
 		} else {
 			mergedNode = wrapConflict(null, local, remote);
@@ -179,11 +179,10 @@ public class ActionMerger {
 		} else if (type == Type.COMMENT || type == Type.BLOCK_COMMENT) {
 			// keep base comment - don't apply any update
 		} else {
-			if (local.getContent().equals(remote.getContent())) {
+			if (local.contentEquals(remote)) {
 				// just apply one update
 				remoteUpdate.apply();
-			} else if (base.getContent().equals(local.getContent()) || 
-					base.getContent().equals(remote.getContent())) {
+			} else if (base.contentEquals(local) || base.contentEquals(remote)) {
 				// in this case one tree updated indentation and the other updated content
 				// update.apply() will update only changed fields, so the following works
 				localUpdate.apply();
@@ -5,11 +5,17 @@ import java.util.Set;
 import java.util.TreeMap;
 import java.util.TreeSet;
 
+import java.io.DataInput;
+import java.io.DataOutput;
+import java.io.IOException;
+import java.util.Arrays;
 import java.util.Collection;
 import java.util.HashMap;
 import java.util.HashSet;
 
+import smerge.ast.AST;
 import smerge.ast.ASTNode;
+import smerge.ast.BinaryFormat;
 
 /**
  * An ActionSet represents a diff between two ASTs by storing sets of different Actions.
@@ -20,6 +26,10 @@ import smerge.ast.ASTNode;
  */
 public class ActionSet {
 	
+	// header of the binary form (see write)
+	private static final int MAGIC = 0x534d4153; // "SMAS"
+	private static final int VERSION = 1;
+	
 	private Set<Integer> parents;
 	private Map<Integer, Update> updates;
 	
@@ -177,6 +187,161 @@ public class ActionSet {
 		}
 	}
 	
+	/**
+	 * Writes this ActionSet in a compact binary form that read() turns back into an
+	 * equal ActionSet. Actions are written as blocks of records that refer to nodes by id,
+	 * one block for each kind of action, so the trees they act on have to be stored
+	 * separately (see AST.write).
+	 * @param out to write the actions to
+	 * @throws IOException if there is an error writing
+	 */
+	public void write(DataOutput out) throws IOException {
+		BinaryFormat.writeHeader(out, MAGIC, VERSION);
+		writeSet(out, parents);
+		
+		// inserts: parent id, position in the set, child id, position of the insert
+		IntBlock block = new IntBlock();
+		for (Map<Integer, Insert> insertSet : insertSets.values()) {
+			for (Map.Entry<Integer, Insert> entry : insertSet.entrySet()) {
+				Insert insert = entry.getValue();
+				block.add(insert.getParentID(), entry.getKey(), insert.getChild().getID(), insert.getPosition());
+			}
+		}
+		block.write(out);
+		writeSet(out, insertedIDs);
+		
+		// deletes: parent id, position, child id
+		block = new IntBlock();
+		for (Map.Entry<Integer, Map<Integer, Delete>> deleteSet : deleteSets.entrySet()) {
+			for (Map.Entry<Integer, Delete> entry : deleteSet.getValue().entrySet()) {
+				block.add(deleteSet.getKey(), entry.getKey(), entry.getValue().getChild().getID());
+			}
+		}
+		block.write(out);
+		writeSet(out, deletedIDs);
+		
+		// updates: base id, edit id
+		block = new IntBlock();
+		for (Update update : updates.values()) {
+			block.add(update.getBase().getID(), update.getEdit().getID());
+		}
+		block.write(out);
+		
+		// shifts: base parent id, base child id, old position, edit parent id, edit child id, new position
+		block = new IntBlock();
+		for (Set<Shift> shiftSet : shiftSets.values()) {
+			for (Shift shift : shiftSet) {
+				block.add(shift.getBaseParent().getID(), shift.getBaseChild().getID(), shift.oldPosition,
+						shift.getEditParent().getID(), shift.getEditChild().getID(), shift.newPosition);
+			}
+		}
+		block.write(out);
+	}
+	
+	/**
+	 * Reads an ActionSet written by write(), resolving node ids against the trees it was
+	 * detected on (see Differ)
+	 * @param in to read the actions from
+	 * @param base - the base tree
+	 * @param edit - the edit tree (either local or remote)
+	 * @return the ActionSet
+	 * @throws IOException if there is an error reading, or an action refers to a node not in the trees
+	 */
+	public static ActionSet read(DataInput in, AST base, AST edit) throws IOException {
+		BinaryFormat.readHeader(in, MAGIC, VERSION);
+		Map<Integer, ASTNode> baseNodes = index(base);
+		Map<Integer, ASTNode> editNodes = index(edit);
+		ActionSet actions = new ActionSet();
+		readSet(in, actions.parents);
+		
+		int[] inserts = readRecords(in, 4);
+		for (int i = 0; i < inserts.length; i += 4) {
+			// an inserted node's parent is in the base tree, unless it was inserted too
+			ASTNode parent = baseNodes.containsKey(inserts[i]) ? baseNodes.get(inserts[i]) : find(editNodes, inserts[i]);
+			ASTNode child = find(editNodes, inserts[i + 2]);
+			if (!actions.insertSets.containsKey(inserts[i])) {
+				actions.insertSets.put(inserts[i], new TreeMap<>());
+			}
+			actions.insertSets.get(inserts[i]).put(inserts[i + 1], new Insert(parent, child, inserts[i + 3]));
+		}
+		readSet(in, actions.insertedIDs);
+		
+		int[] deletes = readRecords(in, 3);
+		for (int i = 0; i < deletes.length; i += 3) {
+			if (!actions.deleteSets.containsKey(deletes[i])) {
+				actions.deleteSets.put(deletes[i], new TreeMap<>((a, b) -> b.compareTo(a)));
+			}
+			actions.deleteSets.get(deletes[i]).put(deletes[i + 1], new Delete(find(baseNodes, deletes[i + 2])));
+		}
+		readSet(in, actions.deletedIDs);
+		
+		int[] updates = readRecords(in, 2);
+		for (int i = 0; i < updates.length; i += 2) {
+			actions.updates.put(updates[i], new Update(find(baseNodes, updates[i]), find(editNodes, updates[i + 1])));
+		}
+		
+		int[] shifts = readRecords(in, 6);
+		for (int i = 0; i < shifts.length; i += 6) {
+			if (!actions.shiftSets.containsKey(shifts[i])) {
+				actions.shiftSets.put(shifts[i], new HashSet<>());
+			}
+			actions.shiftSets.get(shifts[i]).add(new Shift(find(baseNodes, shifts[i]), find(baseNodes, shifts[i + 1]),
+					shifts[i + 2], find(editNodes, shifts[i + 3]), find(editNodes, shifts[i + 4]), shifts[i + 5]));
+		}
+		return actions;
+	}
+	
+	// writes a set of ids as a block
+	private static void writeSet(DataOutput out, Set<Integer> ids) throws IOException {
+		IntBlock block = new IntBlock();
+		for (int id : ids) block.add(id);
+		block.write(out);
+	}
+	
+	// reads a block of ids into a set
+	private static void readSet(DataInput in, Set<Integer> ids) throws IOException {
+		for (int id : BinaryFormat.readInts(in)) ids.add(id);
+	}
+	
+	// reads a block of records of the given number of ints each
+	private static int[] readRecords(DataInput in, int recordSize) throws IOException {
+		int[] records = BinaryFormat.readInts(in);
+		if (records.length % recordSize != 0) throw new IOException("truncated action record");
+		return records;
+	}
+	
+	// maps the ids of a tree's nodes to the nodes
+	private static Map<Integer, ASTNode> index(AST tree) {
+		Map<Integer, ASTNode> nodes = new HashMap<>();
+		for (ASTNode node : tree) nodes.put(node.getID(), node);
+		return nodes;
+	}
+	
+	// returns the node with the given id, which must exist
+	private static ASTNode find(Map<Integer, ASTNode> nodes, int id) throws IOException {
+		ASTNode node = nodes.get(id);
+		if (node == null) throw new IOException("no node with id " + id);
+		return node;
+	}
+	
+	// a growable block of ints, written in one go
+	private static class IntBlock {
+		private int[] values = new int[16];
+		private int size;
+		
+		void add(int... record) {
+			if (size + record.length > values.length) {
+				values = Arrays.copyOf(values, Math.max(values.length * 2, size + record.length));
+			}
+			System.arraycopy(record, 0, values, size, record.length);
+			size += record.length;
+		}
+		
+		void write(DataOutput out) throws IOException {
+			BinaryFormat.writeInts(out, values, size);
+		}
+	}
+	
 	// Getter methods
 	
 	/**
@@ -24,7 +24,14 @@ public class Delete implements Action {
 	 * @return the position of the node to be deleted
 	 */
 	public int getPosition() {
-		return child.getParent().children().indexOf(child);
+		return child.getPosition();
+	}
+	
+	/**
+	 * @return the node to be deleted
+	 */
+	public ASTNode getChild() {
+		return child;
 	}
 	
 	/**
@@ -39,7 +46,7 @@ public class Delete implements Action {
 	 * Applies the action
 	 */
 	public void apply() {
-		child.getParent().children().remove(child);
+		child.getParent().removeChild(child);
 	}
 	
 	/*
@@ -30,8 +30,7 @@ public class Insert implements Action {
 	 * Applies the Insert action
 	 */
 	public void apply() {
-		parent.children().add(position, child);
-		child.setParent(parent);
+		parent.insertChild(position, child);
 
 	}
 	
@@ -44,8 +44,8 @@ public class Update implements Action {
 	public void apply() {
 		if (base.getIndentation() != edit.getIndentation())
 			base.setIndentation(edit.getIndentation());
-		if (!base.getContent().equals(edit.getContent()))
-			base.setContent(edit.getContent());
+		if (!base.contentEquals(edit))
+			base.setContent(edit.content());
 	}
 	
 	/*
@@ -1,6 +1,14 @@
 package smerge.ast;
 
+import java.io.DataInput;
+import java.io.DataOutput;
+import java.io.IOException;
+import java.util.ArrayDeque;
+import java.util.Arrays;
+import java.util.Collections;
+import java.util.Deque;
 import java.util.Iterator;
+import java.util.List;
 
 import smerge.parsers.Parser;
 
@@ -8,6 +16,11 @@ import smerge.parsers.Parser;
  * This class represents a generic Abstract Syntax Tree. It is a wrapper
  * around a root ASTNode.
  * 
+ * The nodes of the tree are also kept flattened into an array in pre-order, along with where
+ * each node's subtree ends in it and the nodes of each type, so that the whole tree or a
+ * subtree can be scanned without walking it. The array is built the first time it is needed
+ * and again whenever the shape of the tree has changed since.
+ * 
  * @author Jediah Conachan
  */
 public class AST implements Iterable<ASTNode> {
@@ -16,6 +29,9 @@ public class AST implements Iterable<ASTNode> {
 	private Parser parser;
 	private ASTNode root;
 	
+	// the nodes in pre-order, as of the modCount of the root
+	private volatile Flattened flattened;
+	
 	/**
 	 * Constructs an AST
 	 * @param root ASTNode
@@ -39,7 +55,61 @@ public class AST implements Iterable<ASTNode> {
 	 * @return ASTNode Iterator
 	 */
 	public Iterator<ASTNode> iterator() {
-		return root.preOrder();
+		return nodes().iterator();
+	}
+	
+	/**
+	 * Returns the nodes of this tree in pre-order. The list can't be modified, and is only
+	 * up to date until the shape of the tree changes.
+	 * @return List of ASTNodes in pre-order
+	 */
+	public List<ASTNode> nodes() {
+		return flattened().list;
+	}
+	
+	/**
+	 * Returns the index of a node in nodes()
+	 * @param node of this tree
+	 * @return the index of the node, or -1 if it is not in this tree
+	 */
+	public int indexOf(ASTNode node) {
+		ASTNode[] nodes = flattened().nodes;
+		int index = node.getPreOrderIndex();
+		return index >= 0 && index < nodes.length && nodes[index] == node ? index : -1;
+	}
+	
+	/**
+	 * Returns where the subtree of a node ends in nodes(). The subtree of the node at index
+	 * is nodes()[index, subtreeEnd(index)).
+	 * @param index of the root of the subtree in nodes()
+	 * @return the index after the last node of the subtree
+	 */
+	public int subtreeEnd(int index) {
+		return flattened().ends[index];
+	}
+	
+	/**
+	 * Returns the indices in nodes() of the nodes of a type, in increasing order. The array
+	 * must not be modified.
+	 * @param type of the nodes, or null for the nodes without a type
+	 * @return the indices of the nodes of the type
+	 */
+	public int[] indicesOf(ASTNode.Type type) {
+		return flattened().types[bucket(type)];
+	}
+	
+	// returns the flattened tree, flattening it again if its shape has changed
+	private Flattened flattened() {
+		Flattened flattened = this.flattened;
+		if (flattened == null || flattened.modCount != root.modCount()) {
+			synchronized (this) {
+				flattened = this.flattened;
+				if (flattened == null || flattened.modCount != root.modCount()) {
+					flattened = this.flattened = new Flattened(root);
+				}
+			}
+		}
+		return flattened;
 	}
 
 	/**
@@ -51,10 +121,84 @@ public class AST implements Iterable<ASTNode> {
 		return parser.unparse(this);
 	}
 	
+	/**
+	 * Writes this tree in a compact binary form (see CompactAST.write)
+	 * @param out to write the tree to
+	 * @throws IOException if there is an error writing
+	 */
+	public void write(DataOutput out) throws IOException {
+		CompactAST.of(this).write(out);
+	}
+	
+	/**
+	 * Reads a tree written by write()
+	 * @param in to read the tree from
+	 * @param parser that parsed the tree, used to unparse it
+	 * @return the tree
+	 * @throws IOException if there is an error reading, or the data is not a tree
+	 */
+	public static AST read(DataInput in, Parser parser) throws IOException {
+		return CompactAST.read(in).toAST(parser);
+	}
+	
 	// used for debugging purposes
 	public String debugTree() {
 		StringBuilder sb = new StringBuilder();
 		root.debugTree(sb, "");
 		return sb.toString();
 	}
+	
+	// returns the index of the nodes of a type in Flattened.types, the last one for no type
+	private static int bucket(ASTNode.Type type) {
+		return type == null ? ASTNode.Type.values().length : type.ordinal();
+	}
+	
+	// the nodes of a tree in pre-order, where their subtrees end and the nodes of each type
+	private static class Flattened {
+		private final int modCount;
+		private final ASTNode[] nodes;
+		private final List<ASTNode> list;
+		private final int[] ends;
+		private final int[][] types;
+		
+		private Flattened(ASTNode root) {
+			modCount = root.modCount();
+			
+			ASTNode[] nodes = new ASTNode[16];
+			int count = 0;
+			int[] typeCounts = new int[ASTNode.Type.values().length + 1];
+			Deque<ASTNode> stack = new ArrayDeque<>();
+			stack.push(root);
+			while (!stack.isEmpty()) {
+				ASTNode node = stack.pop();
+				if (count == nodes.length) nodes = Arrays.copyOf(nodes, count * 2);
+				node.setPreOrderIndex(count);
+				nodes[count++] = node;
+				typeCounts[bucket(node.getType())]++;
+				List<ASTNode> children = node.children();
+				for (int i = children.size() - 1; i >= 0; i--) {
+					stack.push(children.get(i));
+				}
+			}
+			this.nodes = nodes = Arrays.copyOf(nodes, count);
+			list = Collections.unmodifiableList(Arrays.asList(nodes));
+			
+			// children come after their parents, so their subtrees end first
+			ends = new int[count];
+			for (int i = count - 1; i >= 0; i--) {
+				List<ASTNode> children = nodes[i].children();
+				ends[i] = children.isEmpty() ? i + 1 : ends[children.get(children.size() - 1).getPreOrderIndex()];
+			}
+			
+			types = new int[typeCounts.length][];
+			for (int t = 0; t < types.length; t++) {
+				types[t] = new int[typeCounts[t]];
+				typeCounts[t] = 0;
+			}
+			for (int i = 0; i < count; i++) {
+				int t = bucket(nodes[i].getType());
+				types[t][typeCounts[t]++] = i;
+			}
+		}
+	}
 }
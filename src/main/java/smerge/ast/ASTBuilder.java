@@ -0,0 +1,75 @@
+package smerge.ast;
+
+import java.util.Arrays;
+
+import smerge.parsers.Parser;
+
+/**
+ * An ASTBuilder builds the ASTNodes of a tree directly as a parser adds them, for trees
+ * that aren't needed in compact form (see CompactAST) too, e.g. to be cached. Like
+ * CompactAST.toAST, it remembers the source text of the subtrees that unparse back to
+ * exactly that text, and content is sliced from the source, not copied.
+ *
+ * @author Jediah Conachan
+ */
+public class ASTBuilder implements TreeBuilder {
+
+	private final CharSequence source;
+
+	// the nodes in the order they were added, i.e. in pre-order
+	private int size;
+	private ASTNode[] nodes = new ASTNode[16];
+	private int[] parents = new int[16]; // -1 for the root
+
+	/**
+	 * Constructs an empty tree whose content will be sliced from the given source
+	 * @param source buffer that node content is sliced from
+	 */
+	public ASTBuilder(CharSequence source) {
+		this.source = source;
+	}
+
+	@Override
+	public int add(int parent, ASTNode.Type type, int indentation, CharSequence content, int id) {
+		if (parent < 0 && size > 0) throw new IllegalArgumentException("tree already has a root");
+		if (parent >= size) throw new IndexOutOfBoundsException("parent " + parent);
+		if (size == nodes.length) {
+			nodes = Arrays.copyOf(nodes, size * 2);
+			parents = Arrays.copyOf(parents, size * 2);
+		}
+		int index = size++;
+		ASTNode node = new ASTNode(type, content, indentation);
+		node.setID(id);
+		nodes[index] = node;
+		parents[index] = parent;
+		if (parent >= 0) nodes[parent].addChild(node);
+		return index;
+	}
+
+	@Override
+	public int getParent(int index) {
+		checkIndex(index);
+		return parents[index];
+	}
+
+	@Override
+	public int getIndentation(int index) {
+		checkIndex(index);
+		return nodes[index].getIndentation();
+	}
+
+	/**
+	 * Returns the tree built so far
+	 * @param parser used to parse this tree
+	 * @return the AST
+	 */
+	public AST toAST(Parser parser) {
+		if (size == 0) throw new IllegalStateException("tree has no root");
+		CompactAST.findSourceSpans(source, nodes, size);
+		return new AST(nodes[0], parser);
+	}
+
+	private void checkIndex(int index) {
+		if (index < 0 || index >= size) throw new IndexOutOfBoundsException("node " + index);
+	}
+}
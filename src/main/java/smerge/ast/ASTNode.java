@@ -1,8 +1,10 @@
 package smerge.ast;
 
+import java.util.ArrayDeque;
 import java.util.ArrayList;
+import java.util.Collections;
+import java.util.Deque;
 import java.util.List;
-import java.util.Stack;
 
 import smerge.parsers.Parser;
 
@@ -12,6 +14,27 @@ import java.util.Iterator;
  * An ASTNode object represents a node of an abstract syntax tree.
  * Each ASTNode encapsulates a type, source code content, and source code indentation.
  * 
+ * Content is held as a CharSequence. Nodes built by a parser hold a SourceSlice of the parsed
+ * source, which is only copied into a String when getContent() is called.
+ * 
+ * A parsed node also remembers the range of the source its subtree was parsed from, as long
+ * as unparsing the subtree reproduces that range exactly (see getSourceText). Changing a node
+ * forgets the range of the node and of its ancestors, so unchanged subtrees can be copied
+ * straight from the source when the tree is unparsed.
+ * 
+ * Each node also has a structural hash of its subtree (see subtreeHash), computed the first
+ * time it is asked for and kept until the subtree changes, so that identical subtrees of
+ * different trees can be found without comparing them node by node.
+ * 
+ * Adding, inserting or removing a node counts as a change to the shape of the tree, which
+ * the topmost ancestor of the node keeps count of, so that an AST knows when the nodes it
+ * flattened into an array (see AST.nodes) are out of date.
+ * 
+ * Nodes also remember their position among their siblings. A node's children keep their
+ * positions as long as nothing is inserted or removed before them; the ones after are only
+ * renumbered when the position of one of them is asked for, so getPosition takes constant
+ * time in a tree that is built or edited front to back.
+ * 
  * @author Jediah Conachan
  */
 
@@ -29,25 +52,43 @@ public class ASTNode {
 	}
 	
 	private Type type;
-	private String content;
+	private CharSequence content;
 	private int indentation;
 
 	private ASTNode parent;
-	private List<ASTNode> children;
+	private List<ASTNode> children; // null until the first child is added
+	
+	// the index of this node in its parent's children, if it is below the parent's validPositions
+	private int position;
+	// the number of children, from the first, whose positions are up to date
+	private int validPositions;
 	
 	private int id;
 	
+	// source[sourceStart, sourceEnd) of the content's source is the text of this
+	// unchanged subtree, or sourceStart is -1
+	private int sourceStart = -1;
+	private int sourceEnd;
+	
+	// hash of this subtree, if hashed
+	private int subtreeHash;
+	private boolean hashed;
+	
+	// number of changes to the shape of the tree, kept by its root
+	private int modCount;
+	// index of this node in the pre-order array of its tree (see AST.nodes), if it is up to date
+	private int preOrderIndex = -1;
+	
 	/**
 	 * Constructs an ASTNode with the given type, content, and indentation
 	 * @param type ASTNode.Type of the node
 	 * @param content from the source file
 	 * @param indentation from the source file
 	 */
-	public ASTNode(Type type, String content, int indentation) {
+	public ASTNode(Type type, CharSequence content, int indentation) {
 		this.type = type;
 		this.content = content;
 		this.indentation = indentation;
-		this.children = new ArrayList<>();
 		this.id = -1;
 	}
 
@@ -59,12 +100,12 @@ public class ASTNode {
 	}
 	
 	/**
-	 * Returns a direct list of this node's children. 
-	 * Modifying the returned list also modifies the children of this node.
+	 * Returns a direct list of this node's children. Leaf nodes share an immutable
+	 * empty list, so use addChild/insertChild/removeChild to modify children.
 	 * @return a List of ASTNode objects
 	 */
 	public List<ASTNode> children() {
-		return children;
+		return children == null ? Collections.<ASTNode>emptyList() : children;
 	}
 	
 	/**
@@ -72,9 +113,132 @@ public class ASTNode {
 	 * @param child to be added
 	 */
 	public void addChild(ASTNode child) {
-		if (child.parent != null) child.parent.children.remove(child);
+		if (child.parent != null) child.parent.removeChild(child);
+		if (children == null) children = new ArrayList<>();
 		children.add(child);
 		child.parent = this;
+		if (validPositions == children.size() - 1) {
+			child.position = validPositions++;
+		}
+		changed();
+		shapeChanged();
+	}
+	
+	/**
+	 * Inserts the given child at the given position of this node's children.
+	 * Unlike addChild, the child is not removed from the children of its previous parent.
+	 * @param position index the child will have
+	 * @param child to be inserted
+	 */
+	public void insertChild(int position, ASTNode child) {
+		// the previous parent still holds the child, but won't hear of its changes anymore
+		if (child.parent != null && child.parent != this) {
+			child.parent.changed();
+			child.parent.shapeChanged();
+		}
+		if (children == null) children = new ArrayList<>();
+		children.add(position, child);
+		child.parent = this;
+		validPositions = Math.min(validPositions, position);
+		changed();
+		shapeChanged();
+	}
+	
+	/**
+	 * Removes the given child from this node's children
+	 * @param child to be removed
+	 */
+	public void removeChild(ASTNode child) {
+		if (children != null) {
+			int position = child.parent == this ? child.getPosition() : -1;
+			if (position >= 0) {
+				children.remove(position);
+				validPositions = Math.min(validPositions, position);
+			}
+		}
+		changed();
+		shapeChanged();
+	}
+	
+	/**
+	 * Returns the source text this subtree was parsed from, if the subtree hasn't changed
+	 * since and unparsing it would reproduce that text exactly
+	 * @return the text of this subtree, or null if it has to be unparsed
+	 */
+	public CharSequence getSourceText() {
+		if (sourceStart < 0) return null;
+		return new SourceSlice(((SourceSlice) content).getSource(), sourceStart, sourceEnd - sourceStart);
+	}
+	
+	// sets the range of the content's source that holds the text of this subtree (see CompactAST)
+	void setSourceSpan(int start, int end) {
+		sourceStart = start;
+		sourceEnd = end;
+	}
+	
+	// returns the end of the source text of this subtree if that text starts at start, otherwise -1
+	int sourceEndFrom(int start) {
+		return sourceStart >= 0 && sourceStart == start ? sourceEnd : -1;
+	}
+	
+	// forgets the source text and hash of this subtree and of the subtrees containing it
+	private void changed() {
+		for (ASTNode node = this; node != null && (node.sourceStart >= 0 || node.hashed); node = node.parent) {
+			node.sourceStart = -1;
+			node.hashed = false;
+		}
+	}
+	
+	// counts a change to the shape of the tree containing this node
+	private void shapeChanged() {
+		ASTNode root = this;
+		while (root.parent != null) root = root.parent;
+		root.modCount++;
+	}
+	
+	// returns the number of changes to the shape of this tree, if this is its root
+	int modCount() {
+		return modCount;
+	}
+	
+	int getPreOrderIndex() {
+		return preOrderIndex;
+	}
+	
+	void setPreOrderIndex(int index) {
+		preOrderIndex = index;
+	}
+	
+	/**
+	 * Returns a hash of this subtree's types, contents and shape. Subtrees that are equal
+	 * by subtreeEquals have equal hashes; ids and indentation are not part of the hash.
+	 * @return the hash of this subtree
+	 */
+	public int subtreeHash() {
+		if (!hashed) {
+			int hash = 31 * (type == null ? 0 : type.ordinal() + 1) + contentHash();
+			for (ASTNode child : children()) {
+				hash = 31 * hash + child.subtreeHash();
+			}
+			subtreeHash = hash;
+			hashed = true;
+		}
+		return subtreeHash;
+	}
+	
+	/**
+	 * @param other node
+	 * @return true iff this subtree and other's have the same shape, and the same type and
+	 * content at each node
+	 */
+	public boolean subtreeEquals(ASTNode other) {
+		if (subtreeHash() != other.subtreeHash() || type != other.type || !contentEquals(other)) return false;
+		List<ASTNode> otherChildren = other.children();
+		if (children().size() != otherChildren.size()) return false;
+		for (int i = 0; i < otherChildren.size(); i++) {
+			if (!children.get(i).subtreeEquals(otherChildren.get(i))) return false;
+		}
+		return true;
 	}
 	
 	/**
@@ -90,8 +254,8 @@ public class ASTNode {
 	 * @return
 	 */
 	public String subtreeContent(Parser p) {
-		if (children.isEmpty()) 
-			return content;
+		if (isLeafNode()) 
+			return content.toString();
 		
 		StringBuilder sb = new StringBuilder();
 		p.unparse(this, sb);
@@ -109,20 +273,55 @@ public class ASTNode {
 		return indentation;
 	}
 	
+	/**
+	 * Returns this node's content as a String, copying it out of the source if necessary.
+	 * Prefer content() when the characters are only read.
+	 * @return content String
+	 */
 	public String getContent() {
+		return content.toString();
+	}
+	
+	/**
+	 * Returns this node's content without copying it
+	 * @return content CharSequence
+	 */
+	public CharSequence content() {
 		return content;
 	}
 	
+	/**
+	 * @param other node
+	 * @return true iff this node and other have the same content
+	 */
+	public boolean contentEquals(ASTNode other) {
+		return SourceSlice.contentEquals(content, other.content);
+	}
+	
+	/**
+	 * @return a hash of this node's content, equal for nodes with equal content
+	 */
+	public int contentHash() {
+		return SourceSlice.hash(content);
+	}
+	
 	public void setParent(ASTNode parent) {
+		if (this.parent != null) {
+			this.parent.changed();
+			this.parent.shapeChanged();
+		}
 		this.parent = parent;
+		if (parent != null) parent.shapeChanged();
 	}
 	
-	public void setContent(String content) {
+	public void setContent(CharSequence content) {
 		this.content = content;
+		changed();
 	}
 	
 	public void setIndentation(int indentation) {
 		this.indentation = indentation;
+		changed();
 	}
 	
 	public Type getType() {
@@ -137,8 +336,20 @@ public class ASTNode {
 		this.id = id;
 	}
 	
+	/**
+	 * Returns the index of this node in its parent's children
+	 * @return the position of this node, or -1 if its parent doesn't hold it
+	 */
 	public int getPosition() {
-		return parent.children.indexOf(this);
+		List<ASTNode> siblings = parent.children();
+		if (position >= parent.validPositions || siblings.get(position) != this) {
+			// renumber the children after the last one known to be in place
+			for (int i = parent.validPositions; i < siblings.size(); i++) {
+				siblings.get(i).position = i;
+			}
+			parent.validPositions = siblings.size();
+		}
+		return position < siblings.size() && siblings.get(position) == this ? position : -1;
 	}
 	
 	public boolean isRoot() {
@@ -146,7 +357,7 @@ public class ASTNode {
 	}
 	
 	public boolean isLeafNode() {
-		return children.isEmpty();
+		return children == null || children.isEmpty();
 	}
 	
 	
@@ -168,10 +379,10 @@ public class ASTNode {
 	
 	// pre-order iterator starting with the given root
 	private class NodeIterator implements Iterator<ASTNode> {
-		private Stack<ASTNode> stack;
+		private Deque<ASTNode> stack;
 		
 		public NodeIterator(ASTNode node) {
-	        stack = new Stack<>();
+			stack = new ArrayDeque<>();
 			stack.push(node);
 		}
 
@@ -200,17 +411,13 @@ public class ASTNode {
 	public void debugTree(StringBuilder sb, String indent) {
 		String idString = "(" + id;
 		if (parent != null) {
-			idString += ":" + parent.getID() + "[" + parent.children.indexOf(this) + "]";
+			idString += ":" + parent.getID() + "[" + getPosition() + "]";
 		}
 		idString += ")";
 		for (int i = 0; i < 15 - idString.length(); i++) idString += " ";
 
 		sb.append(idString + indent + content + "\n");
-		if (children == null) {
-			System.out.println(debugNode());
-			throw new RuntimeException("why u null");
-		}
-		for (ASTNode child : children) {
+		for (ASTNode child : children()) {
 			if (child.getID() == 0) {
 				System.out.println(id);
 				throw new RuntimeException("why u root");
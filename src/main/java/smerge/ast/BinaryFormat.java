@@ -0,0 +1,124 @@
+package smerge.ast;
+
+import java.io.DataInput;
+import java.io.DataOutput;
+import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.charset.StandardCharsets;
+import java.util.Arrays;
+
+/**
+ * Helper methods for the binary forms of trees and action sets (see CompactAST.write
+ * and ActionSet.write). A binary form starts with a magic number and a version, followed
+ * by blocks: each block is a length and then its values, which are written and read in
+ * bulk rather than one value at a time. All values are big-endian.
+ *
+ * @author Jediah Conachan
+ */
+public final class BinaryFormat {
+
+	// the largest array a block can be read into
+	private static final int MAX_BLOCK_BYTES = Integer.MAX_VALUE - 8;
+
+	// blocks are read this many bytes at a time, and their arrays only grow as the bytes
+	// arrive, so a corrupt length runs out of data instead of allocating an array that big
+	private static final int CHUNK_BYTES = 1 << 16;
+
+	private BinaryFormat() {}
+
+	/**
+	 * Writes the header of a binary form
+	 * @param out - to write the header to
+	 * @param magic - number identifying the kind of data that follows
+	 * @param version - version of the form
+	 * @throws IOException if there is an error writing
+	 */
+	public static void writeHeader(DataOutput out, int magic, int version) throws IOException {
+		out.writeInt(magic);
+		out.writeInt(version);
+	}
+
+	/**
+	 * Reads the header of a binary form and checks that it is the expected one
+	 * @param in - to read the header from
+	 * @param magic - number identifying the kind of data expected
+	 * @param version - the version of the form that can be read
+	 * @throws IOException if there is an error reading, or the header is not the expected one
+	 */
+	public static void readHeader(DataInput in, int magic, int version) throws IOException {
+		if (in.readInt() != magic) throw new IOException("unexpected data, magic number doesn't match");
+		int actual = in.readInt();
+		if (actual != version) throw new IOException("unsupported version " + actual + ", expected " + version);
+	}
+
+	/**
+	 * Writes the first length values of an array as a block
+	 */
+	public static void writeInts(DataOutput out, int[] values, int length) throws IOException {
+		ByteBuffer buffer = ByteBuffer.allocate(length * 4);
+		buffer.asIntBuffer().put(values, 0, length);
+		out.writeInt(length);
+		out.write(buffer.array());
+	}
+
+	/**
+	 * Reads a block written by writeInts
+	 */
+	public static int[] readInts(DataInput in) throws IOException {
+		int length = readLength(in, 4);
+		int[] values = new int[Math.min(length, CHUNK_BYTES / 4)];
+		byte[] chunk = new byte[Math.min(length * 4, CHUNK_BYTES)];
+		for (int read = 0; read < length;) {
+			if (read == values.length) values = Arrays.copyOf(values, (int) Math.min(length, 2L * read));
+			int count = Math.min(values.length - read, chunk.length / 4);
+			in.readFully(chunk, 0, count * 4);
+			ByteBuffer.wrap(chunk, 0, count * 4).asIntBuffer().get(values, read, count);
+			read += count;
+		}
+		return values;
+	}
+
+	/**
+	 * Writes the first length values of an array as a block
+	 */
+	public static void writeBytes(DataOutput out, byte[] values, int length) throws IOException {
+		out.writeInt(length);
+		out.write(values, 0, length);
+	}
+
+	/**
+	 * Reads a block written by writeBytes
+	 */
+	public static byte[] readBytes(DataInput in) throws IOException {
+		int length = readLength(in, 1);
+		byte[] values = new byte[Math.min(length, CHUNK_BYTES)];
+		for (int read = 0; read < length;) {
+			if (read == values.length) values = Arrays.copyOf(values, (int) Math.min(length, 2L * read));
+			in.readFully(values, read, values.length - read);
+			read = values.length;
+		}
+		return values;
+	}
+
+	/**
+	 * Writes text as a block of UTF-8
+	 */
+	public static void writeString(DataOutput out, CharSequence text) throws IOException {
+		byte[] bytes = text.toString().getBytes(StandardCharsets.UTF_8);
+		writeBytes(out, bytes, bytes.length);
+	}
+
+	/**
+	 * Reads a block written by writeString
+	 */
+	public static String readString(DataInput in) throws IOException {
+		return new String(readBytes(in), StandardCharsets.UTF_8);
+	}
+
+	// reads the length of a block of values of the given size
+	private static int readLength(DataInput in, int size) throws IOException {
+		int length = in.readInt();
+		if (length < 0 || length > MAX_BLOCK_BYTES / size) throw new IOException("bad block length " + length);
+		return length;
+	}
+}
@@ -0,0 +1,389 @@
+package smerge.ast;
+
+import java.io.DataInput;
+import java.io.DataOutput;
+import java.io.IOException;
+import java.util.Arrays;
+
+import smerge.parsers.Parser;
+
+/**
+ * A CompactAST stores a tree in parallel primitive arrays instead of ASTNode objects.
+ * A node is an index into the arrays; index 0 is always the root. Children are linked
+ * through firstChild/nextSibling, and content is an (offset, length) range of the source
+ * buffer, so a tree of n nodes costs a handful of arrays rather than n objects with a
+ * child list and a String each.
+ *
+ * Parsers build this form when the tree is cached or parsed in parallel chunks (see
+ * Parser.parseCompact), and toAST() turns it into the mutable ASTNode tree that matching,
+ * diffing and merging work on. Trees needed only as ASTNodes are built directly instead
+ * (see ASTBuilder).
+ *
+ * @author Jediah Conachan
+ */
+public class CompactAST implements TreeBuilder {
+
+	private static final ASTNode.Type[] TYPES = ASTNode.Type.values();
+
+	// header of the binary form (see write)
+	private static final int MAGIC = 0x534d4154; // "SMAT"
+	private static final int VERSION = 2;
+
+	private int size;
+	private byte[] types;         // Type.ordinal() + 1, or 0 for untyped nodes
+	private int[] indentations;
+	private int[] ids;
+	private int[] parents;        // -1 for the root
+	private int[] firstChildren;  // -1 for leaf nodes
+	private int[] lastChildren;   // -1 for leaf nodes
+	private int[] nextSiblings;   // -1 for last children
+	private int[] contentOffsets; // offset into source, or ~offset into extra
+	private int[] contentLengths;
+
+	// content lives in the source buffer; content that isn't a slice of it
+	// (the root's, or normalized tokens) is appended to extra
+	private CharSequence source;
+	private StringBuilder extra;
+
+	/**
+	 * Constructs an empty tree whose content will be taken from the given source
+	 * @param source buffer that node content is sliced from
+	 */
+	public CompactAST(CharSequence source) {
+		this(source, 16);
+	}
+
+	private CompactAST(CharSequence source, int capacity) {
+		this.source = source;
+		this.extra = new StringBuilder();
+		types = new byte[capacity];
+		indentations = new int[capacity];
+		ids = new int[capacity];
+		parents = new int[capacity];
+		firstChildren = new int[capacity];
+		lastChildren = new int[capacity];
+		nextSiblings = new int[capacity];
+		contentOffsets = new int[capacity];
+		contentLengths = new int[capacity];
+	}
+
+	/**
+	 * Converts the given tree into its compact form. Nodes are stored in pre-order.
+	 * @param tree to convert
+	 * @return the compact form of tree
+	 */
+	public static CompactAST of(AST tree) {
+		CompactAST compact = new CompactAST(findSource(tree.getRoot()));
+		compact.addSubtree(-1, tree.getRoot());
+		return compact;
+	}
+
+	// adds node and its descendants in pre-order
+	private void addSubtree(int parent, ASTNode node) {
+		int index = add(parent, node.getType(), node.getIndentation(), node.content(), node.getID());
+		for (ASTNode child : node.children()) {
+			addSubtree(index, child);
+		}
+	}
+
+	// returns the buffer most of the subtree's content is sliced from, if any
+	private static CharSequence findSource(ASTNode root) {
+		for (ASTNode child : root.children()) {
+			if (child.content() instanceof SourceSlice) {
+				return ((SourceSlice) child.content()).getSource();
+			}
+		}
+		return "";
+	}
+
+	/**
+	 * Adds a node as the last child of parent
+	 * @param parent index of the parent node, or -1 if this is the root
+	 * @param type ASTNode.Type of the node
+	 * @param indentation of the node
+	 * @param content of the node
+	 * @param id of the node
+	 * @return the index of the new node
+	 */
+	public int add(int parent, ASTNode.Type type, int indentation, CharSequence content, int id) {
+		if (parent < 0 && size > 0) throw new IllegalArgumentException("tree already has a root");
+		if (parent >= size) throw new IndexOutOfBoundsException("parent " + parent);
+		if (size == types.length) grow();
+		int index = size++;
+		types[index] = (byte) (type == null ? 0 : type.ordinal() + 1);
+		indentations[index] = indentation;
+		ids[index] = id;
+		parents[index] = parent;
+		firstChildren[index] = -1;
+		lastChildren[index] = -1;
+		nextSiblings[index] = -1;
+		setContent(index, content);
+
+		if (parent >= 0) {
+			if (lastChildren[parent] < 0) {
+				firstChildren[parent] = index;
+			} else {
+				nextSiblings[lastChildren[parent]] = index;
+			}
+			lastChildren[parent] = index;
+		}
+		return index;
+	}
+
+	/**
+	 * Adds the children of other's root, with their subtrees, as the last children of parent.
+	 * Content that other slices from this tree's source stays a slice of it.
+	 * @param parent index of the node to add the subtrees under
+	 * @param other tree whose nodes are added; its parents must come before their children
+	 * @param idOffset added to the id of every node added
+	 */
+	public void addSubtrees(int parent, CompactAST other, int idOffset) {
+		checkIndex(parent);
+		int base = size - 1; // index that other's node i is added at, less i
+		for (int i = 1; i < other.size; i++) {
+			int otherParent = other.parents[i];
+			add(otherParent == 0 ? parent : base + otherParent, other.getType(i), other.indentations[i],
+					other.getContent(i), other.ids[i] + idOffset);
+		}
+	}
+
+	// stores content as a range of the source if it is a slice of it, otherwise copies it into extra
+	private void setContent(int index, CharSequence content) {
+		if (content instanceof SourceSlice && ((SourceSlice) content).getSource() == source) {
+			contentOffsets[index] = ((SourceSlice) content).getOffset();
+		} else {
+			contentOffsets[index] = ~extra.length();
+			extra.append(content);
+		}
+		contentLengths[index] = content.length();
+	}
+
+	private void grow() {
+		int capacity = types.length * 2;
+		types = Arrays.copyOf(types, capacity);
+		indentations = Arrays.copyOf(indentations, capacity);
+		ids = Arrays.copyOf(ids, capacity);
+		parents = Arrays.copyOf(parents, capacity);
+		firstChildren = Arrays.copyOf(firstChildren, capacity);
+		lastChildren = Arrays.copyOf(lastChildren, capacity);
+		nextSiblings = Arrays.copyOf(nextSiblings, capacity);
+		contentOffsets = Arrays.copyOf(contentOffsets, capacity);
+		contentLengths = Arrays.copyOf(contentLengths, capacity);
+	}
+
+	/**
+	 * Builds the ASTNode tree represented by this compact tree. Node content is sliced
+	 * from this tree's buffers, not copied.
+	 * @param parser used to parse this tree
+	 * @return an equivalent AST
+	 */
+	public AST toAST(Parser parser) {
+		if (size == 0) throw new IllegalStateException("tree has no root");
+		ASTNode[] nodes = new ASTNode[size];
+		for (int i = 0; i < size; i++) {
+			nodes[i] = new ASTNode(getType(i), getContent(i), indentations[i]);
+			nodes[i].setID(ids[i]);
+		}
+		for (int i = 0; i < size; i++) {
+			for (int child = firstChildren[i]; child >= 0; child = nextSiblings[child]) {
+				nodes[i].addChild(nodes[child]);
+			}
+		}
+		findSourceSpans(source, nodes, size);
+		return new AST(nodes[0], parser);
+	}
+	
+	/**
+	 * Remembers the source text of subtrees that unparse back to exactly that text: every
+	 * line is the node's indentation in spaces, its content and a line break, and the
+	 * lines follow each other in pre-order (e.g. not a blank line that was moved out of
+	 * the block it was found in). Only content sliced from source is found there.
+	 * @param source - the source the nodes were parsed from
+	 * @param nodes - the nodes of a tree in pre-order, starting with its root
+	 * @param count - the number of nodes
+	 */
+	static void findSourceSpans(CharSequence source, ASTNode[] nodes, int count) {
+		// children come after their parents, so going backwards finds the text of every
+		// child before its parent's
+		for (int i = count - 1; i > 0; i--) {
+			ASTNode node = nodes[i];
+			CharSequence content = node.content();
+			boolean slice = content instanceof SourceSlice && ((SourceSlice) content).getSource() == source;
+			int offset = slice ? ((SourceSlice) content).getOffset() : -1;
+			int end = lineEnd(source, offset, node.getIndentation(), content.length());
+			for (ASTNode child : node.children()) {
+				if (end < 0) break;
+				end = child.sourceEndFrom(end);
+			}
+			if (end >= 0) node.setSourceSpan(offset - node.getIndentation(), end);
+		}
+	}
+	
+	// returns the end of the line (after its line break) holding content at the given offset
+	// of source if the line is exactly indentation spaces, the content and "\n", otherwise -1
+	private static int lineEnd(CharSequence source, int offset, int indentation, int length) {
+		int start = offset - indentation;
+		int end = offset + length;
+		if (offset < 0 || start < 0 || end >= source.length() || source.charAt(end) != '\n') return -1;
+		if (start > 0 && source.charAt(start - 1) != '\n') return -1;
+		for (int j = start; j < offset; j++) {
+			if (source.charAt(j) != ' ') return -1;
+		}
+		return end + 1;
+	}
+
+	/**
+	 * Writes this tree in a binary form that read() turns back into an equal tree.
+	 * The form holds the node types, indentations, ids and parents as blocks of
+	 * bytes and ints, followed by the lengths of the nodes' content and a table
+	 * with all of that content, so the tree can be read without its source.
+	 * @param out to write the tree to
+	 * @throws IOException if there is an error writing
+	 */
+	public void write(DataOutput out) throws IOException {
+		BinaryFormat.writeHeader(out, MAGIC, VERSION);
+		BinaryFormat.writeBytes(out, types, size);
+		BinaryFormat.writeInts(out, indentations, size);
+		BinaryFormat.writeInts(out, ids, size);
+		BinaryFormat.writeInts(out, parents, size);
+		BinaryFormat.writeInts(out, contentLengths, size);
+		StringBuilder table = new StringBuilder();
+		for (int i = 0; i < size; i++) {
+			table.append(getContent(i));
+		}
+		BinaryFormat.writeString(out, table);
+	}
+
+	/**
+	 * Reads a tree written by write(). The content of its nodes are slices of a single
+	 * String holding the content table.
+	 * @param in to read the tree from
+	 * @return the tree
+	 * @throws IOException if there is an error reading, or the data is not a tree
+	 */
+	public static CompactAST read(DataInput in) throws IOException {
+		BinaryFormat.readHeader(in, MAGIC, VERSION);
+		byte[] types = BinaryFormat.readBytes(in);
+		int size = types.length;
+		if (size == 0) throw new IOException("tree has no root");
+		int[] indentations = readInts(in, size);
+		int[] ids = readInts(in, size);
+		int[] parents = readInts(in, size);
+		int[] contentLengths = readInts(in, size);
+		String table = BinaryFormat.readString(in);
+
+		CompactAST tree = new CompactAST(table, 0);
+		tree.size = size;
+		tree.types = types;
+		tree.indentations = indentations;
+		tree.ids = ids;
+		tree.parents = parents;
+		tree.contentLengths = contentLengths;
+		tree.contentOffsets = new int[size];
+		tree.firstChildren = new int[size];
+		tree.lastChildren = new int[size];
+		tree.nextSiblings = new int[size];
+		tree.link();
+		return tree;
+	}
+
+	// reads an int block that must hold one value per node
+	private static int[] readInts(DataInput in, int size) throws IOException {
+		int[] values = BinaryFormat.readInts(in);
+		if (values.length != size) throw new IOException("expected " + size + " values, found " + values.length);
+		return values;
+	}
+
+	// rebuilds the content offsets and child links, checking that the data read describes a tree
+	private void link() throws IOException {
+		Arrays.fill(firstChildren, -1);
+		Arrays.fill(lastChildren, -1);
+		Arrays.fill(nextSiblings, -1);
+		if (parents[0] != -1) throw new IOException("node 0 is not the root");
+		int offset = 0;
+		for (int i = 0; i < size; i++) {
+			if ((types[i] & 0xff) > TYPES.length) throw new IOException("node " + i + " has an unknown type");
+			if (contentLengths[i] < 0 || offset + contentLengths[i] > source.length()) {
+				throw new IOException("node " + i + " has content out of bounds");
+			}
+			contentOffsets[i] = offset;
+			offset += contentLengths[i];
+			if (i == 0) continue;
+
+			int parent = parents[i];
+			if (parent < 0 || parent >= i) throw new IOException("node " + i + " comes before its parent");
+			if (lastChildren[parent] < 0) {
+				firstChildren[parent] = i;
+			} else {
+				nextSiblings[lastChildren[parent]] = i;
+			}
+			lastChildren[parent] = i;
+		}
+		if (offset != source.length()) throw new IOException("content table doesn't match the nodes");
+	}
+
+
+	// Getter Methods
+
+	/**
+	 * @return the number of nodes in this tree, including the root
+	 */
+	public int size() {
+		return size;
+	}
+
+	public ASTNode.Type getType(int index) {
+		checkIndex(index);
+		return types[index] == 0 ? null : TYPES[types[index] - 1];
+	}
+
+	public int getIndentation(int index) {
+		checkIndex(index);
+		return indentations[index];
+	}
+
+	public int getID(int index) {
+		checkIndex(index);
+		return ids[index];
+	}
+
+	/**
+	 * @return the index of the node's parent, or -1 for the root
+	 */
+	public int getParent(int index) {
+		checkIndex(index);
+		return parents[index];
+	}
+
+	/**
+	 * @return the index of the node's first child, or -1 if it is a leaf
+	 */
+	public int getFirstChild(int index) {
+		checkIndex(index);
+		return firstChildren[index];
+	}
+
+	/**
+	 * @return the index of the node's next sibling, or -1 if it is the last child
+	 */
+	public int getNextSibling(int index) {
+		checkIndex(index);
+		return nextSiblings[index];
+	}
+
+	/**
+	 * Returns the node's content as a view into this tree's buffers
+	 */
+	public CharSequence getContent(int index) {
+		checkIndex(index);
+		int offset = contentOffsets[index];
+		if (offset >= 0) {
+			return new SourceSlice(source, offset, contentLengths[index]);
+		}
+		return new SourceSlice(extra, ~offset, contentLengths[index]);
+	}
+
+	private void checkIndex(int index) {
+		if (index < 0 || index >= size) throw new IndexOutOfBoundsException("node " + index);
+	}
+}
@@ -0,0 +1,168 @@
+package smerge.ast;
+
+import java.io.IOException;
+import java.io.Writer;
+import java.nio.CharBuffer;
+
+/**
+ * A SourceSlice is a view of a range of characters in a source buffer. Parsers give ASTNodes
+ * slices of the parsed source as their content, so the text of a tree is stored only once
+ * (in the source buffer) and is copied into a String only when one is asked for.
+ *
+ * @author Jediah Conachan
+ */
+public final class SourceSlice implements CharSequence {
+
+	private final CharSequence source;
+	private final int offset;
+	private final int length;
+
+	private int hash; // cached, same value as String.hashCode()
+
+	/**
+	 * Constructs a view of length characters of source, starting at offset
+	 * @param source buffer holding the characters
+	 * @param offset index of the first character in source
+	 * @param length number of characters
+	 */
+	public SourceSlice(CharSequence source, int offset, int length) {
+		if (offset < 0 || length < 0 || offset + length > source.length()) {
+			throw new IndexOutOfBoundsException("slice [" + offset + ", " + (offset + length) +
+					") of a buffer of length " + source.length());
+		}
+		this.source = source;
+		this.offset = offset;
+		this.length = length;
+	}
+
+	/**
+	 * @return the buffer this slice is a view of
+	 */
+	public CharSequence getSource() {
+		return source;
+	}
+
+	/**
+	 * @return the index of this slice's first character in its buffer
+	 */
+	public int getOffset() {
+		return offset;
+	}
+
+	@Override
+	public int length() {
+		return length;
+	}
+
+	@Override
+	public char charAt(int index) {
+		if (index < 0 || index >= length) throw new IndexOutOfBoundsException("index " + index);
+		return source.charAt(offset + index);
+	}
+
+	@Override
+	public CharSequence subSequence(int start, int end) {
+		if (start < 0 || start > end || end > length) {
+			throw new IndexOutOfBoundsException("subSequence [" + start + ", " + end + ")");
+		}
+		return new SourceSlice(source, offset + start, end - start);
+	}
+
+	/**
+	 * Appends this slice to out (see write)
+	 * @param out - to append the characters to
+	 * @throws IOException if out throws one
+	 */
+	public void appendTo(Appendable out) throws IOException {
+		write(out, source, offset, offset + length);
+	}
+
+	/**
+	 * Copies this slice into a new String
+	 */
+	@Override
+	public String toString() {
+		return source.subSequence(offset, offset + length).toString();
+	}
+
+	/**
+	 * Two slices are equal if they hold the same characters, wherever they point to
+	 */
+	@Override
+	public boolean equals(Object o) {
+		if (o instanceof SourceSlice) {
+			return contentEquals(this, (SourceSlice) o);
+		}
+		return false;
+	}
+
+	@Override
+	public int hashCode() {
+		int h = hash;
+		if (h == 0) {
+			for (int i = 0; i < length; i++) {
+				h = 31 * h + source.charAt(offset + i);
+			}
+			hash = h;
+		}
+		return h;
+	}
+
+	/**
+	 * Appends s[start, end) to out. Unlike Writer.append(), which copies the characters
+	 * into a temporary String first, a Writer is handed the characters straight from a
+	 * String or from the array behind a CharBuffer.
+	 * @param out - to append the characters to
+	 * @param s - holds the characters
+	 * @param start - index of the first character to append
+	 * @param end - index after the last character to append
+	 * @throws IOException if out throws one
+	 */
+	public static void write(Appendable out, CharSequence s, int start, int end) throws IOException {
+		if (s instanceof SourceSlice) {
+			SourceSlice slice = (SourceSlice) s;
+			write(out, slice.source, slice.offset + start, slice.offset + end);
+		} else if (!(out instanceof Writer)) {
+			out.append(s, start, end);
+		} else if (s instanceof String) {
+			((Writer) out).write((String) s, start, end - start);
+		} else if (s instanceof CharBuffer && ((CharBuffer) s).hasArray()) {
+			CharBuffer buffer = (CharBuffer) s;
+			((Writer) out).write(buffer.array(), buffer.arrayOffset() + buffer.position() + start, end - start);
+		} else {
+			Writer writer = (Writer) out;
+			for (int i = start; i < end; i++) {
+				writer.write(s.charAt(i));
+			}
+		}
+	}
+
+	/**
+	 * Compares the characters of two CharSequences (Strings, slices or otherwise)
+	 * @return true iff a and b hold the same characters
+	 */
+	public static boolean contentEquals(CharSequence a, CharSequence b) {
+		if (a == b) return true;
+		int length = a.length();
+		if (length != b.length()) return false;
+		if (a instanceof String && b instanceof String) return a.equals(b);
+		for (int i = 0; i < length; i++) {
+			if (a.charAt(i) != b.charAt(i)) return false;
+		}
+		return true;
+	}
+
+	/**
+	 * Hashes the characters of a CharSequence. Equal content always hashes the same,
+	 * whether it is held in a String or a SourceSlice.
+	 * @return String.hashCode() of the sequence's characters
+	 */
+	public static int hash(CharSequence s) {
+		if (s instanceof String || s instanceof SourceSlice) return s.hashCode();
+		int h = 0;
+		for (int i = 0; i < s.length(); i++) {
+			h = 31 * h + s.charAt(i);
+		}
+		return h;
+	}
+}
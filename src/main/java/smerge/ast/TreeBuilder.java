@@ -0,0 +1,31 @@
+package smerge.ast;
+
+/**
+ * A TreeBuilder is what a parser adds the nodes of a tree to, one at a time in pre-order.
+ * Nodes are referred to by the index add() returns for them; the root is added first.
+ *
+ * @author Jediah Conachan
+ */
+public interface TreeBuilder {
+
+	/**
+	 * Adds a node as the last child of parent
+	 * @param parent index of the parent node, or -1 if this is the root
+	 * @param type ASTNode.Type of the node
+	 * @param indentation of the node
+	 * @param content of the node
+	 * @param id of the node
+	 * @return the index of the new node
+	 */
+	int add(int parent, ASTNode.Type type, int indentation, CharSequence content, int id);
+
+	/**
+	 * @return the index of the node's parent, or -1 for the root
+	 */
+	int getParent(int index);
+
+	/**
+	 * @return the indentation of the node
+	 */
+	int getIndentation(int index);
+}
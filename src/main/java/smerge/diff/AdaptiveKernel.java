@@ -0,0 +1,31 @@
+package smerge.diff;
+
+/**
+ * The DistanceKernel Matcher uses: picks the fastest kernel for each pair of lines.
+ * Lines that fit in a word go to MyersKernel. For longer ones, BandedKernel fills
+ * 2 * limit + 1 cells per character where BlockMyersKernel does about a dozen word
+ * operations per block of 64 characters, so the smaller of the two wins.
+ * 
+ * @author Alva Wei, Jediah Conachan
+ */
+public class AdaptiveKernel implements DistanceKernel {
+	
+	private final MyersKernel myers = new MyersKernel();
+	private final BlockMyersKernel blockMyers = new BlockMyersKernel();
+	private final BandedKernel banded = new BandedKernel();
+	
+	@Override
+	public int distance(char[] a, int aLength, char[] b, int bLength, int limit) {
+		// the distance is at least the difference in length
+		if (Math.abs(aLength - bLength) > limit) return limit + 1;
+		
+		int shorter = Math.min(aLength, bLength);
+		if (shorter <= MyersKernel.MAX_LENGTH) {
+			return myers.distance(a, aLength, b, bLength, limit);
+		}
+		if (2 * limit + 1 <= 12 * ((shorter + 63) / 64)) {
+			return banded.distance(a, aLength, b, bLength, limit);
+		}
+		return blockMyers.distance(a, aLength, b, bLength, limit);
+	}
+}
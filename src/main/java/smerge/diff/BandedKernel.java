@@ -0,0 +1,55 @@
+package smerge.diff;
+
+/**
+ * A DistanceKernel that only fills in the band of the Levenshtein matrix within limit of
+ * its diagonal, since no path leaving the band can cost limit or less, and stops as soon as
+ * a whole row of the band is above limit (Ukkonen's cut-off). It takes O(limit) time per
+ * row, which makes it the fastest kernel for long lines and small limits.
+ * 
+ * @author Alva Wei, Jediah Conachan
+ */
+public class BandedKernel implements DistanceKernel {
+	
+	private int[] previousRow = new int[64];
+	private int[] currentRow = new int[64];
+	
+	@Override
+	public int distance(char[] a, int aLength, char[] b, int bLength, int limit) {
+		if (Math.abs(aLength - bLength) > limit) return limit + 1;
+		int outside = limit + 1; // any value above limit
+		if (previousRow.length <= bLength + 1) {
+			previousRow = new int[bLength + 2];
+			currentRow = new int[bLength + 2];
+		}
+		int[] previous = previousRow;
+		int[] current = currentRow;
+		
+		// i == 0
+		int to = Math.min(bLength, limit);
+		for (int j = 0; j <= to; j++) {
+			previous[j] = j;
+		}
+		previous[to + 1] = outside;
+		
+		for (int i = 1; i <= aLength; i++) {
+			int from = Math.max(1, i - limit);
+			to = Math.min(bLength, i + limit);
+			current[from - 1] = from == 1 ? Math.min(i, outside) : outside;
+			int rowMin = current[from - 1];
+			char c = a[i - 1];
+			for (int j = from; j <= to; j++) {
+				int cost = Math.min(previous[j - 1] + (c == b[j - 1] ? 0 : 1),
+						Math.min(previous[j], current[j - 1]) + 1);
+				current[j] = Math.min(cost, outside);
+				rowMin = Math.min(rowMin, current[j]);
+			}
+			current[to + 1] = outside;
+			if (rowMin > limit) return outside;
+			
+			int[] swap = previous;
+			previous = current;
+			current = swap;
+		}
+		return previous[bLength];
+	}
+}
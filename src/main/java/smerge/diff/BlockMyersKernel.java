@@ -0,0 +1,76 @@
+package smerge.diff;
+
+import java.util.Arrays;
+
+/**
+ * The bit-parallel DistanceKernel of MyersKernel for lines of any length: the bit vectors
+ * of a column are split into blocks of 64 characters, and the horizontal delta at the
+ * bottom of each block is carried into the next one.
+ * 
+ * @author Alva Wei, Jediah Conachan
+ */
+public class BlockMyersKernel implements DistanceKernel {
+	
+	private static final long HIGH_BIT = 1L << 63;
+	
+	private final PatternTable table = new PatternTable();
+	private long[] pvs = new long[4]; // vertical deltas of +1, by block
+	private long[] mvs = new long[4]; // vertical deltas of -1, by block
+	
+	@Override
+	public int distance(char[] a, int aLength, char[] b, int bLength, int limit) {
+		// the shorter line is the pattern, encoded as bits
+		if (aLength > bLength) return distance(b, bLength, a, aLength, limit);
+		if (aLength == 0) return bLength;
+		if (bLength - aLength > limit) return limit + 1;
+		
+		int blocks = (aLength + 63) >>> 6;
+		if (pvs.length < blocks) {
+			pvs = new long[blocks];
+			mvs = new long[blocks];
+		}
+		Arrays.fill(pvs, 0, blocks, -1L);
+		Arrays.fill(mvs, 0, blocks, 0);
+		table.build(a, aLength, blocks);
+		long[] masks = table.masks();
+		long last = 1L << ((aLength - 1) & 63);
+		int score = aLength;
+		for (int j = 0; j < bLength; j++) {
+			int offset = table.slot(b[j]) * blocks;
+			int hin = 1; // the first row of the matrix grows by one every column
+			for (int k = 0; k < blocks; k++) {
+				long eq = masks[offset + k];
+				long pv = pvs[k];
+				long mv = mvs[k];
+				long xv = eq | mv;
+				if (hin < 0) eq |= 1;
+				long xh = (((eq & pv) + pv) ^ pv) | eq;
+				long ph = mv | ~(xh | pv);
+				long mh = pv & xh;
+				
+				// horizontal delta at the bottom of the block (the last character for the last block)
+				long bottom = k == blocks - 1 ? last : HIGH_BIT;
+				int hout = (ph & bottom) != 0 ? 1 : (mh & bottom) != 0 ? -1 : 0;
+				ph <<= 1;
+				mh <<= 1;
+				if (hin < 0) {
+					mh |= 1;
+				} else if (hin > 0) {
+					ph |= 1;
+				}
+				pvs[k] = mh | ~(xv | ph);
+				mvs[k] = ph & xv;
+				hin = hout;
+			}
+			score += hin;
+			
+			// each remaining column lowers the score by at most one
+			if (score - (bLength - j - 1) > limit) {
+				score = limit + 1;
+				break;
+			}
+		}
+		table.clear(a, aLength);
+		return score;
+	}
+}
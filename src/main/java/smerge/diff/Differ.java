@@ -1,7 +1,5 @@
 package smerge.diff;
 
-import java.util.List;
-
 import smerge.actions.ActionSet;
 import smerge.ast.AST;
 import smerge.ast.ASTNode;
@@ -15,7 +13,7 @@ import smerge.ast.ASTNode;
 public class Differ {
 	
 	private Matcher matcher;
-	private List<Match> matchList;
+	private MatchTable matches;
 	
 	/**
 	 * 
@@ -24,16 +22,28 @@ public class Differ {
 	 * @param remote remote tree
 	 */
 	public Differ(AST base, AST local, AST remote)  {
-		this.matcher = new Matcher(base, local, remote);
-		this.matchList = matcher.matches();
+		this(base, local, remote, false);
+	}
+	
+	/**
+	 * 
+	 * @param base base tree
+	 * @param local local tree
+	 * @param remote remote tree
+	 * @param scoped true to search for similar nodes near their matched parents first
+	 * (see Matcher)
+	 */
+	public Differ(AST base, AST local, AST remote, boolean scoped)  {
+		this.matcher = new Matcher(base, local, remote, scoped);
+		this.matches = matcher.matches();
 	}
 	
 	
 	/**
-	 * @return the list of matches
+	 * @return the table of matches
 	 */
-	public List<Match> getMatches() {
-		return matchList;
+	public MatchTable getMatches() {
+		return matches;
 	}
 	
 	/**
@@ -44,9 +54,9 @@ public class Differ {
 	 */
 	public void diff(ActionSet localActions, ActionSet remoteActions) {
 		// for each match in matches, all detect actions on base/local, base/remote
-		for (Match m : matchList) {
-			detectActions(m.getID(), m.getBaseNode(), m.getLocalNode(), localActions);
-			detectActions(m.getID(), m.getBaseNode(), m.getRemoteNode(), remoteActions);
+		for (int id = 0; id < matches.size(); id++) {
+			detectActions(id, matches.getBaseNode(id), matches.getLocalNode(id), localActions);
+			detectActions(id, matches.getBaseNode(id), matches.getRemoteNode(id), remoteActions);
 		}
 		localActions.minimize();
 		remoteActions.minimize();
@@ -69,12 +79,12 @@ public class Differ {
 				// a new node was inserted
 				
 				// get the base parent equivalent
-				ASTNode parent = matchList.get(edit.getParent().getID()).getBaseNode();
+				ASTNode parent = matches.getBaseNode(edit.getParent().getID());
 				if (parent == null) {
 					// base parent equivalent doesn't exist, parent must also be an insert
 					parent = edit.getParent();
 				}
-				actions.addInsert(parent, edit, edit.getParent().children().indexOf(edit));
+				actions.addInsert(parent, edit, edit.getPosition());
 			}
 		} else if (edit == null) {
 			// node was deleted from base
@@ -84,10 +94,10 @@ public class Differ {
 			if (base.getParent() != null && edit.getParent() != null) {
 				int baseParentID = base.getParent().getID();
 				int editParentID = edit.getParent().getID();
-				int baseNodeIndex = base.getParent().children().indexOf(base);
-				int editNodeIndex = edit.getParent().children().indexOf(edit);
+				int baseNodeIndex = base.getPosition();
+				int editNodeIndex = edit.getPosition();
 				
-				ASTNode parent = matchList.get(editParentID).getBaseNode();				
+				ASTNode parent = matches.getBaseNode(editParentID);				
 				if (baseParentID != editParentID) {
 					if (parent == null) {
 						// base parent equivalent doesn't exist, parent must also be an insert
@@ -101,7 +111,7 @@ public class Differ {
 					actions.addShift(parent, base, baseNodeIndex, edit.getParent(), edit, editNodeIndex);
 				}
 			}
-			if (!base.getContent().equals(edit.getContent())) {
+			if (!base.contentEquals(edit)) {
 				// node updated
 				actions.addUpdate(base, edit);
 			}
@@ -0,0 +1,26 @@
+package smerge.diff;
+
+/**
+ * A DistanceKernel computes the Levenshtein distance between two lines, which Matcher
+ * uses to measure how similar two nodes are. Lines are given as the first aLength and
+ * bLength characters of two arrays; callers fold case beforehand if they want to ignore it.
+ * 
+ * Kernels reuse their scratch buffers between calls, so an instance must not be shared
+ * between threads.
+ * 
+ * @author Alva Wei, Jediah Conachan
+ */
+public interface DistanceKernel {
+	
+	/**
+	 * Computes the distance between a[0, aLength) and b[0, bLength), as far as it matters:
+	 * distances above limit may be reported as any value above limit
+	 * @param a - the characters of the first line
+	 * @param aLength - the length of the first line
+	 * @param b - the characters of the second line
+	 * @param bLength - the length of the second line
+	 * @param limit - the largest distance the caller is interested in
+	 * @return the distance if it is at most limit, otherwise a value above limit
+	 */
+	int distance(char[] a, int aLength, char[] b, int bLength, int limit);
+}
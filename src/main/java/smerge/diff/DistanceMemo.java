@@ -0,0 +1,221 @@
+package smerge.diff;
+
+import java.util.concurrent.ConcurrentHashMap;
+import java.util.concurrent.atomic.AtomicInteger;
+import java.util.concurrent.atomic.LongAdder;
+
+import smerge.ast.SourceSlice;
+
+/**
+ * A DistanceMemo remembers the edit distances Matcher computes between base nodes and edit
+ * lines, so that a line appearing in both the local and remote trees (e.g. from an upstream
+ * commit both branches contain) is only compared with each base node once.
+ *
+ * The memo is keyed by the content of the edit line: Matcher looks up the line once per edit
+ * node, and gets the distances from that line to base nodes by id. Distances are computed up
+ * to a limit, so an entry either holds the exact distance or only that the distance exceeds
+ * some limit. Lines are looked up from several threads without a lock; each line has a lock of
+ * its own, which is only contended when both trees are matching the same line at once.
+ *
+ * The memo is bounded: it holds up to a given number of lines and a given number of
+ * distances across all of them, and once either is reached it doesn't remember any more.
+ *
+ * @author Alva Wei, Jediah Conachan
+ */
+public class DistanceMemo {
+
+	// the number of distances a memo holds unless told otherwise
+	public static final int DEFAULT_MAX_ENTRIES = 1 << 20;
+
+	private final ConcurrentHashMap<Key, Line> lines = new ConcurrentHashMap<>();
+	private final int capacity;
+	private final int maxEntries;
+	private final AtomicInteger size = new AtomicInteger();
+	private final AtomicInteger entries = new AtomicInteger();
+	private final LongAdder hits = new LongAdder();
+	private final LongAdder misses = new LongAdder();
+
+	/**
+	 * Constructs a memo holding the distances of up to capacity lines, and up to
+	 * DEFAULT_MAX_ENTRIES distances in all
+	 * @param capacity - the number of lines to keep
+	 */
+	public DistanceMemo(int capacity) {
+		this(capacity, DEFAULT_MAX_ENTRIES);
+	}
+
+	/**
+	 * Constructs a memo holding the distances of up to capacity lines, and up to
+	 * maxEntries distances in all
+	 * @param capacity - the number of lines to keep
+	 * @param maxEntries - the number of distances to keep
+	 */
+	public DistanceMemo(int capacity, int maxEntries) {
+		this.capacity = capacity;
+		this.maxEntries = maxEntries;
+	}
+
+	/**
+	 * Looks up the distances of an edit line
+	 * @param content - content of the edit line
+	 * @return the distances of the line, or null if the memo is full and doesn't hold the line
+	 */
+	Line line(CharSequence content) {
+		Key key = new Key(content);
+		Line line = lines.get(key);
+		if (line == null && size.get() < capacity && entries.get() < maxEntries) {
+			line = lines.computeIfAbsent(key, k -> {
+				size.incrementAndGet();
+				return new Line();
+			});
+		}
+		return line;
+	}
+
+	/**
+	 * @return the number of lookups that found the distance
+	 */
+	public long hits() {
+		return hits.sum();
+	}
+
+	/**
+	 * @return the number of lookups that didn't find the distance
+	 */
+	public long misses() {
+		return misses.sum();
+	}
+
+	/**
+	 * @return the fraction of lookups that found the distance, or 0 if there were none
+	 */
+	public double hitRate() {
+		long hits = hits();
+		long lookups = hits + misses();
+		return lookups == 0 ? 0 : (double) hits / lookups;
+	}
+
+	/**
+	 * @return the number of distances held
+	 */
+	public int size() {
+		return entries.get();
+	}
+
+	@Override
+	public String toString() {
+		return String.format("%d hits, %d misses (%.1f%%), %d lines, %d distances",
+				hits(), misses(), 100 * hitRate(), size.get(), entries.get());
+	}
+
+	// takes one of the memo's entries for a new distance, unless all of them are taken
+	private boolean reserveEntry() {
+		for (int taken = entries.get(); taken < maxEntries; taken = entries.get()) {
+			if (entries.compareAndSet(taken, taken + 1)) return true;
+		}
+		return false;
+	}
+
+	/**
+	 * The distances from one edit line to base nodes, in a hash table from base id to
+	 * distance. A distance d is stored as d, and a distance only known to be larger than a
+	 * limit l as ~l.
+	 */
+	class Line {
+		private int[] ids = new int[8]; // base id + 1, or 0 for an empty slot
+		private int[] values = new int[8];
+		private int count;
+
+		/**
+		 * Looks up the distance between the line and a base node
+		 * @param baseID - id of the base node
+		 * @param limit - the largest distance of interest
+		 * @return the distance if it is known and at most limit, limit + 1 if it is known to be
+		 * larger than limit, or -1 if it has to be computed
+		 */
+		synchronized int get(int baseID, int limit) {
+			int slot = slot(baseID);
+			if (ids[slot] != 0) {
+				int value = values[slot];
+				if (value >= 0 || ~value >= limit) {
+					hits.increment();
+					return value >= 0 ? Math.min(value, limit + 1) : limit + 1;
+				}
+			}
+			misses.increment();
+			return -1;
+		}
+
+		/**
+		 * Remembers the distance between the line and a base node, unless it is a new one
+		 * and the memo already holds as many distances as it can
+		 * @param baseID - id of the base node
+		 * @param distance - the distance computed with the given limit
+		 * @param limit - the limit the distance was computed with; distances larger than it
+		 * are only known to be larger
+		 */
+		synchronized void put(int baseID, int distance, int limit) {
+			int slot = slot(baseID);
+			if (ids[slot] == 0) {
+				if (!reserveEntry()) return;
+				if (2 * (count + 1) > ids.length) {
+					grow();
+					slot = slot(baseID);
+				}
+				ids[slot] = baseID + 1;
+				values[slot] = distance <= limit ? distance : ~limit;
+				count++;
+			} else if (distance <= limit) {
+				values[slot] = distance;
+			} else if (values[slot] < 0 && ~values[slot] < limit) {
+				values[slot] = ~limit;
+			}
+		}
+
+		// returns the slot holding baseID, or the empty slot it would go in
+		private int slot(int baseID) {
+			int mask = ids.length - 1;
+			int hash = baseID * 0x9E3779B9;
+			int slot = (hash ^ hash >>> 16) & mask;
+			while (ids[slot] != 0 && ids[slot] != baseID + 1) {
+				slot = (slot + 1) & mask;
+			}
+			return slot;
+		}
+
+		// doubles the size of the table
+		private void grow() {
+			int[] oldIDs = ids;
+			int[] oldValues = values;
+			ids = new int[oldIDs.length * 2];
+			values = new int[oldIDs.length * 2];
+			for (int i = 0; i < oldIDs.length; i++) {
+				if (oldIDs[i] == 0) continue;
+				int slot = slot(oldIDs[i] - 1);
+				ids[slot] = oldIDs[i];
+				values[slot] = oldValues[i];
+			}
+		}
+	}
+
+	// the content of an edit line
+	private static class Key {
+		private final CharSequence content;
+		private final int hash;
+
+		private Key(CharSequence content) {
+			this.content = content;
+			this.hash = SourceSlice.hash(content);
+		}
+
+		@Override
+		public boolean equals(Object o) {
+			return o instanceof Key && hash == ((Key) o).hash && SourceSlice.contentEquals(content, ((Key) o).content);
+		}
+
+		@Override
+		public int hashCode() {
+			return hash;
+		}
+	}
+}
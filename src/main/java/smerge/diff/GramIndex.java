@@ -0,0 +1,137 @@
+package smerge.diff;
+
+import java.util.Arrays;
+import java.util.HashMap;
+import java.util.Map;
+
+/**
+ * An inverted index of the q-grams (substrings of Q characters) in the lower-cased
+ * content of a tree's nodes, for finding the lines that may be within an edit distance
+ * of a given line. Two lines of lengths m and n within distance k share at least
+ * max(m, n) - Q + 1 - k * Q q-grams (counted with multiplicity), so lines that share
+ * fewer need not be compared at all.
+ *
+ * Nodes are numbered in pre-order, the same way Matcher labels the base tree. Once built,
+ * the index can be searched from several threads at once.
+ *
+ * @author Alva Wei, Jediah Conachan
+ */
+class GramIndex {
+
+	static final int Q = 3;
+
+	// the nodes containing each q-gram and how many times they contain it
+	private final Map<Long, Postings> index = new HashMap<>();
+	private final int[] lengths;
+
+	// indexes lines, chars[i] holding the lower-cased content of node i
+	GramIndex(char[][] chars) {
+		lengths = new int[chars.length];
+		long[] grams = new long[64];
+		for (int id = 0; id < chars.length; id++) {
+			int length = chars[id].length;
+			lengths[id] = length;
+
+			grams = grams(chars[id], length, grams);
+			int count = Math.max(0, length - Q + 1);
+			for (int i = 0; i < count; ) {
+				int j = i + 1;
+				while (j < count && grams[j] == grams[i]) j++;
+				index.computeIfAbsent(grams[i], k -> new Postings()).add(id, j - i);
+				i = j;
+			}
+		}
+	}
+
+	// returns the content length of a node
+	int length(int node) {
+		return lengths[node];
+	}
+
+	// counts the q-grams each node in result's range shares with chars[0, length) into result,
+	// and returns the number of nodes that share at least one, which are the first ones in
+	// result.found()
+	int search(char[] chars, int length, Result result) {
+		int[] shared = result.shared;
+		int[] found = result.found;
+		int from = result.from;
+		for (int i = 0; i < result.count; i++) {
+			shared[found[i] - from] = 0;
+		}
+		int foundCount = 0;
+
+		long[] grams = result.grams = grams(chars, length, result.grams);
+		int count = Math.max(0, length - Q + 1);
+		for (int i = 0; i < count; ) {
+			int j = i + 1;
+			while (j < count && grams[j] == grams[i]) j++;
+			Postings postings = index.get(grams[i]);
+			if (postings != null) {
+				for (int p = 0; p < postings.size; p++) {
+					int node = postings.nodes[p] - from;
+					if (node < 0 || node >= shared.length) continue;
+					if (shared[node] == 0) found[foundCount++] = node + from;
+					shared[node] += Math.min(j - i, postings.counts[p]);
+				}
+			}
+			i = j;
+		}
+		return result.count = foundCount;
+	}
+
+	// puts the sorted q-grams of chars[0, length) in grams (or a larger array if they don't fit)
+	private static long[] grams(char[] chars, int length, long[] grams) {
+		int count = Math.max(0, length - Q + 1);
+		if (grams.length < count) grams = new long[Math.max(count, grams.length * 2)];
+		for (int i = 0; i < count; i++) {
+			grams[i] = (long) chars[i] << 32 | (long) chars[i + 1] << 16 | chars[i + 2];
+		}
+		Arrays.sort(grams, 0, count);
+		return grams;
+	}
+
+	/**
+	 * The q-grams the nodes in a range share with the line of the last search. Each thread
+	 * searching the index needs a Result of its own.
+	 */
+	static class Result {
+		private final int from;
+		private final int[] shared;
+		private final int[] found;
+		private int count;
+		private long[] grams = new long[64];
+
+		// a result for the nodes [from, to)
+		Result(int from, int to) {
+			this.from = from;
+			shared = new int[to - from];
+			found = new int[to - from];
+		}
+
+		// the nodes found, in no particular order
+		int[] found() {
+			return found;
+		}
+
+		// the number of q-grams a node shares with the line
+		int shared(int node) {
+			return shared[node - from];
+		}
+	}
+
+	// the nodes containing a q-gram
+	private static class Postings {
+		private int[] nodes = new int[4];
+		private int[] counts = new int[4];
+		private int size;
+
+		private void add(int node, int count) {
+			if (size == nodes.length) {
+				nodes = Arrays.copyOf(nodes, size * 2);
+				counts = Arrays.copyOf(counts, size * 2);
+			}
+			nodes[size] = node;
+			counts[size++] = count;
+		}
+	}
+}
@@ -0,0 +1,33 @@
+package smerge.diff;
+
+/**
+ * The reference DistanceKernel: fills in the whole Levenshtein matrix, one row at a time,
+ * ignoring the limit. The other kernels must agree with this one.
+ * 
+ * @author Alva Wei, Jediah Conachan
+ */
+public class LevenshteinKernel implements DistanceKernel {
+	
+	private int[] costs = new int[64];
+	
+	@Override
+	public int distance(char[] a, int aLength, char[] b, int bLength, int limit) {
+		if (costs.length <= bLength) costs = new int[bLength + 1];
+		
+		// i == 0
+		for (int j = 0; j <= bLength; j++) {
+			costs[j] = j;
+		}
+		for (int i = 1; i <= aLength; i++) {
+			// j == 0; nw = lev(i - 1, j)
+			costs[0] = i;
+			int nw = i - 1;
+			for (int j = 1; j <= bLength; j++) {
+				int cj = Math.min(1 + Math.min(costs[j], costs[j - 1]), a[i - 1] == b[j - 1] ? nw : nw + 1);
+				nw = costs[j];
+				costs[j] = cj;
+			}
+		}
+		return costs[bLength];
+	}
+}
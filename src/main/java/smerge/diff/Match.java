@@ -5,22 +5,23 @@ import smerge.ast.ASTNode;
 
 /**
  * A Match object encapsulates up to three versions of an ASTNode (base, local, remote)
- * that share the same ID.
+ * that share the same ID. It is a view of the match with that ID in a MatchTable, which
+ * holds the nodes.
  * 
  * @author Jediah Conachan
  */
 public class Match {
 		
-	private int id;
-	private ASTNode base;
-	private ASTNode local;
-	private ASTNode remote;	
+	private final MatchTable table;
+	private final int id;
 	
 	/**
-	 * Constructs an empty Match object for the given ID
+	 * Constructs a view of the match with the given ID
+	 * @param table holding the match
 	 * @param id
 	 */
-    public Match(int id) {
+    Match(MatchTable table, int id) {
+    	this.table = table;
     	this.id = id;
     }
     
@@ -30,8 +31,7 @@ public class Match {
      * @return this Match
      */
     public Match setBaseNode(ASTNode base) {
-    	base.setID(id);
-    	this.base = base;
+    	table.setBaseNode(id, base);
     	return this;
     }
     
@@ -42,12 +42,7 @@ public class Match {
      * @return this Match
      */
     public Match setEditNode(ASTNode edit, boolean isLocal) {
-    	edit.setID(id);
-    	if (isLocal) {
-        	this.local = edit;
-    	} else {
-    		this.remote = edit;
-    	}
+    	table.setEditNode(id, edit, isLocal);
     	return this;
     }
     
@@ -64,7 +59,7 @@ public class Match {
      * @return base ASTNode
      */
     public ASTNode getBaseNode() {
-    	return base;
+    	return table.getBaseNode(id);
     }
     
     /**
@@ -72,7 +67,7 @@ public class Match {
      * @return local ASTNode
      */
     public ASTNode getLocalNode() {
-    	return local;
+    	return table.getLocalNode(id);
     }
     
     /**
@@ -80,6 +75,6 @@ public class Match {
      * @return remote ASTNode
      */
     public ASTNode getRemoteNode() {
-    	return remote;
+    	return table.getRemoteNode(id);
     }
 }
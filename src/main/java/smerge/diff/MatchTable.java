@@ -0,0 +1,115 @@
+package smerge.diff;
+
+import java.util.AbstractList;
+import java.util.Arrays;
+import java.util.List;
+import java.util.RandomAccess;
+
+import smerge.ast.ASTNode;
+
+/**
+ * A MatchTable holds the matches between the base, local and remote trees, indexed by id, in
+ * one array of nodes per tree instead of an object per match. Base nodes come first, labeled
+ * 0..baseCount-1, and new edit nodes are added after them.
+ *
+ * As a List, the table gives a Match for each id, which is only a view of the table: it is
+ * made when asked for and reads and writes through to the table.
+ *
+ * The local and remote nodes of existing matches can be set from two threads at once, one
+ * for each tree, but adding matches can't happen at the same time as anything else.
+ *
+ * @author Alva Wei, Jediah Conachan
+ */
+public class MatchTable extends AbstractList<Match> implements RandomAccess {
+
+	// the nodes of each tree by id, or null
+	private ASTNode[] baseNodes;
+	private ASTNode[] localNodes;
+	private ASTNode[] remoteNodes;
+	private int size;
+
+	/**
+	 * Constructs a table of matches for the given base nodes, in order of their ids
+	 * @param baseNodes the nodes of the base tree
+	 */
+	MatchTable(List<ASTNode> baseNodes) {
+		int capacity = Math.max(16, baseNodes.size() * 2);
+		this.baseNodes = new ASTNode[capacity];
+		localNodes = new ASTNode[capacity];
+		remoteNodes = new ASTNode[capacity];
+		for (ASTNode base : baseNodes) {
+			base.setID(size);
+			this.baseNodes[size++] = base;
+		}
+	}
+
+	/**
+	 * Returns a view of the match with the given id
+	 * @param id of the match
+	 * @return Match
+	 */
+	@Override
+	public Match get(int id) {
+		if (id < 0 || id >= size) throw new IndexOutOfBoundsException("no match " + id);
+		return new Match(this, id);
+	}
+
+	/**
+	 * @return the number of matches
+	 */
+	@Override
+	public int size() {
+		return size;
+	}
+
+	/**
+	 * @param id of the match
+	 * @return the base node of the match, or null
+	 */
+	public ASTNode getBaseNode(int id) {
+		return baseNodes[id];
+	}
+
+	/**
+	 * @param id of the match
+	 * @return the local node of the match, or null
+	 */
+	public ASTNode getLocalNode(int id) {
+		return localNodes[id];
+	}
+
+	/**
+	 * @param id of the match
+	 * @return the remote node of the match, or null
+	 */
+	public ASTNode getRemoteNode(int id) {
+		return remoteNodes[id];
+	}
+
+	// sets the base node of a match, giving it the match's id
+	void setBaseNode(int id, ASTNode base) {
+		base.setID(id);
+		baseNodes[id] = base;
+	}
+
+	// sets an edit node (local or remote) of a match, giving it the match's id
+	void setEditNode(int id, ASTNode edit, boolean isLocal) {
+		edit.setID(id);
+		if (isLocal) {
+			localNodes[id] = edit;
+		} else {
+			remoteNodes[id] = edit;
+		}
+	}
+
+	// adds a match with only an edit node (local or remote), and returns its id
+	int addEditNode(ASTNode edit, boolean isLocal) {
+		if (size == baseNodes.length) {
+			baseNodes = Arrays.copyOf(baseNodes, size * 2);
+			localNodes = Arrays.copyOf(localNodes, size * 2);
+			remoteNodes = Arrays.copyOf(remoteNodes, size * 2);
+		}
+		setEditNode(size, edit, isLocal);
+		return size++;
+	}
+}
@@ -1,9 +1,17 @@
 package smerge.diff;
 
+import java.util.ArrayDeque;
 import java.util.ArrayList;
-import java.util.HashSet;
+import java.util.Arrays;
+import java.util.BitSet;
+import java.util.Collections;
+import java.util.Deque;
+import java.util.HashMap;
+import java.util.IdentityHashMap;
 import java.util.List;
-import java.util.Set;
+import java.util.Map;
+import java.util.concurrent.ForkJoinPool;
+import java.util.concurrent.ForkJoinTask;
 
 import smerge.ast.AST;
 import smerge.ast.ASTNode;
@@ -11,139 +19,853 @@ import smerge.ast.ASTNode;
 /**
  * A Matcher object matches nodes between the given base, local, and remote trees.
  * 
+ * Each edit tree is matched in four passes. The first matches whole subtrees that are
+ * identical in both trees (wherever they moved to) through their subtree hashes, so an
+ * unchanged block is matched in one step. The second runs a patience diff over the remaining
+ * nodes of both trees as sequences of lines in pre-order, like git diff would, and matches
+ * the lines it anchors. The third matches the remaining lines that are identical in both
+ * trees through a hash index of the base nodes. Together they take care of most nodes in
+ * linear time. The nodes they leave are compared by edit distance against the base nodes
+ * that share enough q-grams with them to be similar (see GramIndex); short lines, which
+ * the q-grams can't rule out, are compared against every remaining base node.
+ * 
+ * That search can be scoped (see Matcher(AST, AST, AST, boolean)): it then looks among the children of the base node the edit
+ * node's parent is matched to, then between the base nodes anchored before and after the
+ * edit node, then in the subtrees of its parent's base node and of its ancestors in turn, and
+ * takes the most similar node of the first scope that has one. Most lines stay in their
+ * enclosing block, so this compares fewer lines and keeps them from being matched to similar
+ * lines in other functions. Unscoped, as by default, the search looks between the anchors,
+ * then everywhere.
+ * 
+ * In a large tree, the scoped search is first run by region: the nodes in the subtree of a
+ * matched node are only compared to the nodes in the subtree of its base node, so regions
+ * can be matched independently, and the nodes they leave are then searched for in the whole
+ * base tree. How the nodes are split into regions depends on the trees alone.
+ * 
+ * The local and remote trees are matched independently, so by default they are matched in
+ * parallel, as are the regions of each. Nodes that get no match are only given their ids once
+ * both are done, in the same order as when they are matched one after the other, so the
+ * result doesn't depend on it.
+ * 
  * @author Alva Wei, Jediah Conachan
  */
 public class Matcher {
 	
 	// smaller similarity = good
 	private static final double SIM_THRESHOLD = 0.2;
+	
+	// edit lines shorter than this are compared with every base line
+	private static final int MIN_INDEXED_LENGTH = minIndexedLength();
+	
+	// edit trees with at least this many nodes left for the fuzzy search are matched by region,
+	// with regions of up to REGION_SIZE nodes
+	private static final int REGION_THRESHOLD = 1024;
+	private static final int REGION_SIZE = 256;
 
 		
-	private List<Match> matches;
-	private int nextID; // the next id to be given to a new matching
+	private MatchTable matches;
+	
+	// base nodes are labeled 0..baseCount-1 in pre-order, their indices in baseTree.nodes(),
+	// so the subtree of base node id holds the ids [id, baseEnds[id])
+	private AST baseTree;
+	private int baseCount;
+	private int[] baseEnds;
+	private int[] basePositions; // the position of every base node among its siblings
+	
+	// lower-cased content of the base nodes by id
+	private char[][] baseChars;
+	
+	// distances computed so far, shared by the local and remote passes, for about as many
+	// lines as an edit tree the size of the base tree
+	private DistanceMemo memo;
+	
+	// q-grams of the base nodes, built when the first line is matched by edit distance
+	private GramIndex gramIndex;
+	
+	// whether the search for a similar node starts near the node's matched parent
+	private final boolean scoped;
+	
+	// whether the trees and their regions are matched in parallel
+	private final boolean parallel;
 
+	/**
+	 * Constructs a new Matcher object and produces a list of matched nodes,
+	 * searching for similar nodes in the whole base tree (not scoped).
+	 * 
+	 * @param baseTree
+	 * @param localTree
+	 * @param remoteTree
+	 */
+	public Matcher(AST baseTree, AST localTree, AST remoteTree) {
+		this(baseTree, localTree, remoteTree, false, true);
+	}
+	
+	/**
+	 * Constructs a new Matcher object and produces a list of matched nodes,
+	 * matching the local and remote trees in parallel.
+	 * 
+	 * @param baseTree
+	 * @param localTree
+	 * @param remoteTree
+	 * @param scoped - true to search for a node similar to an edit node among the children of
+	 * the base node its parent is matched to first (see the class comment)
+	 */
+	public Matcher(AST baseTree, AST localTree, AST remoteTree, boolean scoped) {
+		this(baseTree, localTree, remoteTree, scoped, true);
+	}
+	
 	/**
 	 * Constructs a new Matcher object and produces a list of matched nodes.
 	 * 
 	 * @param baseTree
 	 * @param localTree
 	 * @param remoteTree
+	 * @param scoped - true to search for a node similar to an edit node among the children of
+	 * the base node its parent is matched to first, then in the subtrees of that node and of its
+	 * ancestors in turn; false to search the whole base tree and take the most similar node
+	 * @param parallel - true to match the local and remote trees (and the regions of each) at
+	 * the same time, false to match one after the other; the matches are the same either way
 	 */
-	public Matcher(AST baseTree, AST localTree, AST remoteTree) {	
-		matches = new ArrayList<>();
+	public Matcher(AST baseTree, AST localTree, AST remoteTree, boolean scoped, boolean parallel) {	
+		this.scoped = scoped;
+		this.parallel = parallel;
 		
 		labelBaseTree(baseTree);
-		match(baseTree, localTree, true);
-		match(baseTree, remoteTree, false);
+		memo = new DistanceMemo(baseCount);
+		// hashes are cached as they are computed, so compute them before the passes share the base tree
+		baseTree.getRoot().subtreeHash();
+		
+		List<ASTNode> localAdded;
+		List<ASTNode> remoteAdded;
+		if (parallel) {
+			ForkJoinTask<List<ASTNode>> remote = ForkJoinPool.commonPool().submit(() -> match(baseTree, remoteTree, false));
+			localAdded = match(baseTree, localTree, true);
+			remoteAdded = remote.join();
+		} else {
+			localAdded = match(baseTree, localTree, true);
+			remoteAdded = match(baseTree, remoteTree, false);
+		}
+		
+		// new nodes are numbered after the base nodes, local ones first
+		for (ASTNode edit : localAdded) {
+			matches.addEditNode(edit, true);
+		}
+		for (ASTNode edit : remoteAdded) {
+			matches.addEditNode(edit, false);
+		}
 	}
 	
 	/**
-	 * Returns a listing of the matched nodes
-	 * @return list of Match objects
+	 * Returns a listing of the matched nodes, indexed by id
+	 * @return table of matches
 	 */
-	public List<Match> matches() {
+	public MatchTable matches() {
 		return matches;
 	}
 	
 	/**
-	 * Matches nodes between two trees, base and edit (which is either local or remote)
+	 * Returns the memo of the edit distances computed while matching, e.g. for its hit rate
+	 * @return the DistanceMemo of this Matcher
+	 */
+	public DistanceMemo distanceMemo() {
+		return memo;
+	}
+	
+	/**
+	 * Matches nodes between two trees, base and edit (which is either local or remote).
+	 * Only sets the edit nodes of the base nodes' matches, so that the local and remote
+	 * trees can be matched at the same time.
 	 * 
 	 * @param baseTree
 	 * @param editTree
 	 * @param isLocal - true iff editTree == localTree, false iff editTree == remoteTree
+	 * @return the edit nodes that match no base node, in pre-order
 	 */
-	private void match(AST baseTree, AST editTree, boolean isLocal) {
-		Set<Integer> matchedIDs = new HashSet<Integer>();
-		matches.get(0).setEditNode(editTree.getRoot(), isLocal);
-		matchedIDs.add(0);
-		
-		// compare each node in the baseTree to each node in editTree
-		for (ASTNode edit : editTree) {
-			if (edit.getID() == 0) continue; // skip root
-			double minSimilarity = 1.0;
+	private List<ASTNode> match(AST baseTree, AST editTree, boolean isLocal) {
+		BitSet matchedIDs = new BitSet(baseCount);
+		matches.setEditNode(0, editTree.getRoot(), isLocal);
+		matchedIDs.set(0);
+		
+		// match identical subtrees first, then the lines a patience diff anchors, then identical lines
+		int[] editPositions = positions(editTree);
+		List<ASTNode> sequence = matchSubtrees(baseTree, editTree, isLocal, matchedIDs, editPositions);
+		int[] anchors = matchAnchors(sequence, isLocal, matchedIDs);
+		List<ASTNode> unanchored = new ArrayList<>();
+		for (int k = 0; k < anchors.length; k++) {
+			if (anchors[k] < 0) unanchored.add(sequence.get(k));
+		}
+		List<ASTNode> unmatched = matchIdentical(baseTree, editTree, unanchored, isLocal, matchedIDs, editPositions);
+		
+		// the base ids between the anchors around each remaining node
+		int[] gapFrom = new int[unmatched.size()];
+		int[] gapTo = new int[unmatched.size()];
+		for (int k = 0, i = 0, from = 0; i < unmatched.size(); k++) {
+			if (sequence.get(k) == unmatched.get(i)) gapFrom[i++] = from;
+			if (anchors[k] >= 0) from = anchors[k] + 1;
+		}
+		for (int k = anchors.length - 1, i = unmatched.size() - 1, to = baseCount; i >= 0; k--) {
+			if (sequence.get(k) == unmatched.get(i)) gapTo[i--] = to;
+			if (anchors[k] >= 0) to = anchors[k];
+		}
+		
+		// match the nodes of large trees by region first, then the rest over the whole base tree
+		List<Integer> rest = new ArrayList<>();
+		if (scoped && unmatched.size() >= REGION_THRESHOLD) {
+			List<Region> regions = regions(editTree.getRoot(), unmatched, rest);
+			List<ForkJoinTask<?>> tasks = new ArrayList<>();
+			for (Region region : regions) {
+				region.claims = new BitSet(region.to);
+				for (int id = matchedIDs.nextSetBit(region.from); id >= 0 && id < region.to;
+						id = matchedIDs.nextSetBit(id + 1)) {
+					region.claims.set(id);
+				}
+				tasks.add(ForkJoinTask.adapt(() -> {
+					region.left = matchSimilar(unmatched, region.nodes, gapFrom, gapTo,
+							new Search(region.from, region.to), region.claims, isLocal);
+				}));
+			}
+			if (parallel) {
+				ForkJoinTask.invokeAll(tasks);
+			} else {
+				for (ForkJoinTask<?> task : tasks) task.invoke();
+			}
+			for (Region region : regions) {
+				matchedIDs.or(region.claims);
+				rest.addAll(region.left);
+			}
+			Collections.sort(rest);
+		} else {
+			for (int i = 0; i < unmatched.size(); i++) rest.add(i);
+		}
+		List<ASTNode> added = new ArrayList<>();
+		for (int i : matchSimilar(unmatched, rest, gapFrom, gapTo, new Search(0, baseCount), matchedIDs, isLocal)) {
+			ASTNode edit = unmatched.get(i);
+			if (edit.getID() < 0) {
+				// no possible match found, a new one is created once both trees are matched
+				added.add(edit);
+			}
+		}
+		return added;
+	}
+	
+	/**
+	 * Matches edit nodes to the most similar base nodes in the region of a search: compares each
+	 * node to the children of the base node its parent is matched to, then to the base nodes in
+	 * its gap between anchors, then to the subtrees of that base node and its ancestors, until
+	 * a similar one is found.
+	 * 
+	 * @param edits - the edit nodes left by the passes before
+	 * @param indices - the indices in edits of the nodes to match, in pre-order
+	 * @param gapFrom - the first base id in the gap of each edit node
+	 * @param gapTo - the base id that ends the gap of each edit node
+	 * @param search - the search to use, which sets the region
+	 * @param matchedIDs - ids of the base nodes matched so far, updated with new matches
+	 * @param isLocal - true iff the edit nodes are from localTree, false iff from remoteTree
+	 * @return the indices of the nodes left unmatched, in pre-order
+	 */
+	private List<Integer> matchSimilar(List<ASTNode> edits, List<Integer> indices, int[] gapFrom, int[] gapTo,
+			Search search, BitSet matchedIDs, boolean isLocal) {
+		List<Integer> left = new ArrayList<>();
+		for (int i : indices) {
+			ASTNode edit = edits.get(i);
+			search.setEditNode(edit);
 			ASTNode bestMatch = null;
-			for (ASTNode base : baseTree) {
+			ASTNode scope = scoped ? matchedBaseNode(edit.getParent()) : null;
+			if (scope != null) {
+				int id = scope.getID();
+				bestMatch = search.bestMatch(matchedIDs, scope, id + 1, baseEnds[id], 0, 0);
+			}
+			if (bestMatch == null) {
+				bestMatch = search.bestMatch(matchedIDs, null, gapFrom[i], gapTo[i], 0, 0);
+			}
+			if (scope != null) {
+				int skipFrom = gapFrom[i];
+				int skipTo = gapTo[i];
+				for (ASTNode ancestor = scope; bestMatch == null && ancestor != null; ancestor = ancestor.getParent()) {
+					int id = ancestor.getID();
+					bestMatch = search.bestMatch(matchedIDs, null, id + 1, baseEnds[id], skipFrom, skipTo);
+					skipFrom = id + 1;
+					skipTo = baseEnds[id];
+					if (id < search.from && skipTo >= search.to) break; // searched the whole region
+				}
+			} else if (bestMatch == null) {
+				bestMatch = search.bestMatch(matchedIDs, null, 0, baseCount, gapFrom[i], gapTo[i]);
+			}
+			
+			if (bestMatch != null) {
+				int id = bestMatch.getID();
+				matches.setEditNode(id, edit, isLocal);
+				matchedIDs.set(id);
+			} else {
+				left.add(i);
+			}
+		}
+		return left;
+	}
+	
+	/**
+	 * Partitions edit nodes into regions that can be matched independently: the subtrees of
+	 * matched edit nodes whose base nodes' subtrees don't overlap. Regions of more than
+	 * REGION_SIZE nodes are split into the subtrees of their matched children.
+	 * 
+	 * @param root - the root of the edit tree
+	 * @param edits - the edit nodes to partition, in pre-order
+	 * @param rest - where the indices of the nodes in no region are added
+	 * @return the regions, each with the indices in edits of its nodes, in pre-order
+	 */
+	private List<Region> regions(ASTNode root, List<ASTNode> edits, List<Integer> rest) {
+		// the number of the edit nodes in the subtree of each node
+		Map<ASTNode, Integer> sizes = new IdentityHashMap<>();
+		for (ASTNode edit : edits) {
+			for (ASTNode node = edit.getParent(); node != null; node = node.getParent()) {
+				sizes.merge(node, 1, Integer::sum);
+			}
+		}
+		
+		// the subtrees of matched nodes that are small enough, top-down
+		List<Region> regions = new ArrayList<>();
+		Deque<ASTNode> stack = new ArrayDeque<>();
+		pushChildren(stack, root);
+		while (!stack.isEmpty()) {
+			ASTNode node = stack.pop();
+			ASTNode base = matchedBaseNode(node);
+			int size = sizes.getOrDefault(node, 0);
+			if (base == null || size == 0) continue;
+			if (size > REGION_SIZE && !node.isLeafNode()) {
+				pushChildren(stack, node);
+			} else {
+				regions.add(new Region(node, base.getID(), baseEnds[base.getID()]));
+			}
+		}
+		
+		// drop regions overlapping others in the base tree, keeping the first by base id
+		regions.sort((a, b) -> Integer.compare(a.from, b.from));
+		Map<ASTNode, Region> byRoot = new IdentityHashMap<>();
+		List<Region> disjoint = new ArrayList<>();
+		int end = 0;
+		for (Region region : regions) {
+			if (region.from < end) continue;
+			byRoot.put(region.root, region);
+			disjoint.add(region);
+			end = region.to;
+		}
+		
+		for (int i = 0; i < edits.size(); i++) {
+			Region region = null;
+			for (ASTNode node = edits.get(i).getParent(); region == null && node != null; node = node.getParent()) {
+				region = byRoot.get(node);
+			}
+			if (region == null) {
+				rest.add(i);
+			} else {
+				region.nodes.add(i);
+			}
+		}
+		return disjoint;
+	}
+	
+	// returns the base node matched to an edit node, or null if it isn't matched to one
+	private ASTNode matchedBaseNode(ASTNode edit) {
+		int id = edit.getID();
+		return id >= 0 && id < baseCount ? matches.getBaseNode(id) : null;
+	}
+	
+	/**
+	 * Matches the edit nodes to the unmatched base nodes a patience diff of the two (as
+	 * sequences of lines in pre-order) anchors, i.e. identical lines in the same order that
+	 * are unique in both sequences or surround such lines.
+	 * 
+	 * @param edits - the edit nodes to match, in pre-order
+	 * @param isLocal - true iff the edit nodes are from localTree, false iff from remoteTree
+	 * @param matchedIDs - ids of the base nodes matched so far, updated with new matches
+	 * @return the id of the base node each edit node is matched to, or -1
+	 */
+	private int[] matchAnchors(List<ASTNode> edits, boolean isLocal, BitSet matchedIDs) {
+		int[] baseIDs = new int[baseCount];
+		int[] baseKeys = new int[baseCount];
+		int count = 0;
+		for (int id = 0; id < baseCount; id++) {
+			if (matchedIDs.get(id)) continue;
+			baseIDs[count] = id;
+			baseKeys[count++] = contentKey(matches.getBaseNode(id));
+		}
+		int[] editKeys = new int[edits.size()];
+		for (int k = 0; k < editKeys.length; k++) {
+			editKeys[k] = contentKey(edits.get(k));
+		}
+		
+		int[] anchors = PatienceDiff.match(editKeys, Arrays.copyOf(baseKeys, count));
+		for (int k = 0; k < anchors.length; k++) {
+			if (anchors[k] < 0) continue;
+			ASTNode edit = edits.get(k);
+			int id = baseIDs[anchors[k]];
+			ASTNode base = matches.getBaseNode(id);
+			if (base.getType() != edit.getType() || !base.contentEquals(edit)) {
+				anchors[k] = -1; // hash collision
+				continue;
+			}
+			anchors[k] = id;
+			matches.setEditNode(id, edit, isLocal);
+			matchedIDs.set(id);
+		}
+		return anchors;
+	}
+	
+	/**
+	 * Matches the subtrees of edit nodes with children to unmatched base subtrees with the
+	 * same shape, types and contents, top-down, so that the largest identical subtrees are
+	 * matched. Base subtrees are chosen like identical lines in matchIdentical.
+	 * 
+	 * @param baseTree
+	 * @param editTree
+	 * @param isLocal - true iff editTree == localTree, false iff editTree == remoteTree
+	 * @param matchedIDs - ids of the base nodes matched so far, updated with new matches
+	 * @param editPositions - the position of every edit node among its siblings (see positions)
+	 * @return the edit nodes (other than the root) left unmatched, in pre-order
+	 */
+	private List<ASTNode> matchSubtrees(AST baseTree, AST editTree, boolean isLocal, BitSet matchedIDs,
+			int[] editPositions) {
+		// unmatched base subtrees (other than leaves) by hash
+		IdenticalIndex index = new IdenticalIndex(matchedIDs, true);
+		List<ASTNode> editNodes = editTree.nodes();
+		for (ASTNode base : baseTree) {
+			if (base.isLeafNode() || matchedIDs.get(base.getID())) continue;
+			index.add(base, base.subtreeHash());
+		}
+		
+		List<ASTNode> unmatched = new ArrayList<>();
+		Deque<ASTNode> stack = new ArrayDeque<>();
+		pushChildren(stack, editTree.getRoot());
+		while (!stack.isEmpty()) {
+			ASTNode edit = stack.pop();
+			int editIndex = editTree.indexOf(edit);
+			ASTNode best = edit.isLeafNode() ? null : index.best(edit, edit.subtreeHash(), editPositions[editIndex]);
+			if (best == null) {
+				unmatched.add(edit);
+				pushChildren(stack, edit);
+			} else {
+				// both subtrees have the same shape, so their nodes are matched in pre-order
+				int baseID = best.getID();
+				for (int id = baseID, i = editIndex; id < baseEnds[baseID]; id++, i++) {
+					matches.setEditNode(id, editNodes.get(i), isLocal);
+					matchedIDs.set(id);
+				}
+			}
+		}
+		return unmatched;
+	}
+	
+	// pushes the children of node, so that they are popped in order
+	private static void pushChildren(Deque<ASTNode> stack, ASTNode node) {
+		List<ASTNode> children = node.children();
+		for (int i = children.size() - 1; i >= 0; i--) {
+			stack.push(children.get(i));
+		}
+	}
+	
+	// returns true iff no node of the base subtree is matched
+	private boolean unmatched(ASTNode root, BitSet matchedIDs) {
+		int matched = matchedIDs.nextSetBit(root.getID());
+		return matched < 0 || matched >= baseEnds[root.getID()];
+	}
+	
+	/**
+	 * Matches edit nodes to unmatched base nodes of the same type and content.
+	 * When several base nodes are identical to an edit node, the one whose parent is
+	 * matched to the edit node's parent is preferred, then the one at the same position
+	 * among its siblings, then the first in pre-order.
+	 * 
+	 * @param baseTree
+	 * @param editTree
+	 * @param edits - the edit nodes to match, in pre-order
+	 * @param isLocal - true iff the edit nodes are from localTree, false iff from remoteTree
+	 * @param matchedIDs - ids of the base nodes matched so far, updated with new matches
+	 * @param editPositions - the position of every edit node among its siblings (see positions)
+	 * @return the edit nodes left unmatched, in pre-order
+	 */
+	private List<ASTNode> matchIdentical(AST baseTree, AST editTree, List<ASTNode> edits, boolean isLocal,
+			BitSet matchedIDs, int[] editPositions) {
+		// unmatched base nodes by type and content
+		IdenticalIndex index = new IdenticalIndex(matchedIDs, false);
+		for (ASTNode base : baseTree) {
+			if (matchedIDs.get(base.getID())) continue;
+			index.add(base, contentKey(base));
+		}
+		
+		List<ASTNode> unmatched = new ArrayList<>();
+		for (ASTNode edit : edits) {
+			ASTNode best = index.best(edit, contentKey(edit), editPositions[editTree.indexOf(edit)]);
+			if (best == null) {
+				unmatched.add(edit);
+			} else {
+				int id = best.getID();
+				matches.setEditNode(id, edit, isLocal);
+				matchedIDs.set(id);
+			}
+		}
+		return unmatched;
+	}
+	
+	// returns the q-gram index of the base nodes, building it on first use
+	private synchronized GramIndex gramIndex() {
+		if (gramIndex == null) gramIndex = new GramIndex(baseChars);
+		return gramIndex;
+	}
+	
+	// the fewest q-grams two lines can share if the longer is maxLength long and they are
+	// similar enough to be matched
+	private static int gramBound(int maxLength) {
+		return maxLength - GramIndex.Q + 1 - distanceLimit(maxLength, 1.0, false) * GramIndex.Q;
+	}
+	
+	// returns the length from which gramBound is positive for every longer line too,
+	// so that lines sharing no q-grams with an edit line can be skipped
+	private static int minIndexedLength() {
+		// the distance limit is at most SIM_THRESHOLD * maxLength, so gramBound is positive past this
+		int length = (int) ((GramIndex.Q - 1) / (1 - GramIndex.Q * SIM_THRESHOLD)) + 1;
+		while (length > 1 && gramBound(length - 1) > 0) {
+			length--;
+		}
+		return length;
+	}
+	
+	// scores how well a base node fits in the place of an identical edit node: 2 if its parent
+	// is matched to the edit node's parent, plus 1 if it is at the same position among its siblings
+	private int score(ASTNode base, ASTNode edit, int editPosition) {
+		int parentID = edit.getParent().getID();
+		return (parentID >= 0 && base.getParent().getID() == parentID ? 2 : 0) +
+				(basePositions[base.getID()] == editPosition ? 1 : 0);
+	}
+	
+	// hashes a node's type and content
+	private static int contentKey(ASTNode node) {
+		ASTNode.Type type = node.getType();
+		return 31 * (type == null ? 0 : type.ordinal() + 1) + node.contentHash();
+	}
+	
+	// returns the position of every node among its siblings, by index in tree.nodes()
+	private static int[] positions(AST tree) {
+		List<ASTNode> nodes = tree.nodes();
+		int[] positions = new int[nodes.size()];
+		for (int i = 0; i < positions.length; i++) {
+			// the first child follows its parent, and each later one follows its sibling's subtree
+			int child = i + 1;
+			for (int k = 0; k < nodes.get(i).children().size(); k++) {
+				positions[child] = k;
+				child = tree.subtreeEnd(child);
+			}
+		}
+		return positions;
+	}
+	
+	private void labelBaseTree(AST baseTree) {
+		this.baseTree = baseTree;
+		matches = new MatchTable(baseTree.nodes());
+		baseCount = matches.size();
+		baseChars = new char[baseCount][];
+		for (int id = 0; id < baseCount; id++) {
+			CharSequence content = matches.getBaseNode(id).content();
+			baseChars[id] = lowerCase(content, new char[content.length()]);
+		}
+		
+		baseEnds = new int[baseCount];
+		for (int id = 0; id < baseCount; id++) {
+			baseEnds[id] = baseTree.subtreeEnd(id);
+		}
+		basePositions = positions(baseTree);
+	}
+	
+	// returns the largest distance d with d / maxLength <= SIM_THRESHOLD and d / maxLength < best
+	// (or <= best, if orEqual), or -1 if there is none
+	private static int distanceLimit(int maxLength, double best, boolean orEqual) {
+		int d = (int) (Math.min(SIM_THRESHOLD, best) * maxLength) + 1;
+		while (d >= 0 && ((double) d / maxLength > SIM_THRESHOLD || (double) d / maxLength > best ||
+				(!orEqual && (double) d / maxLength == best))) {
+			d--;
+		}
+		return d;
+	}
+	
+	// copies s into chars (or a larger array if it doesn't fit), lower-cased
+	private static char[] lowerCase(CharSequence s, char[] chars) {
+		if (chars.length < s.length()) chars = new char[Math.max(s.length(), chars.length * 2)];
+		for (int i = 0; i < s.length(); i++) {
+			chars[i] = Character.toLowerCase(s.charAt(i));
+		}
+		return chars;
+	}
+	
+	/**
+	 * The state of the search for the base node most similar to an edit node, among the base
+	 * nodes in a region (ids [from, to)). Each pass or region is searched with a Search of its
+	 * own, so that they can be matched at the same time.
+	 */
+	private class Search {
+		
+		private final int from;
+		private final int to;
+		
+		// the edit node and its lower-cased content
+		private ASTNode edit;
+		private char[] editChars = new char[64];
+		
+		// ids of the base nodes the edit node may be matched to, in pre-order
+		private final int[] candidateIDs;
+		private int candidateCount;
+		private final long[] order; // candidates in the order they are compared (see bestMatch)
+		private GramIndex.Result grams;
+		
+		// computes the edit distance of two lines (see AdaptiveKernel)
+		private final DistanceKernel kernel = new AdaptiveKernel();
+		// the distances of the edit node's line computed so far, or null if they aren't memoized
+		private DistanceMemo.Line distances;
+		
+		private Search(int from, int to) {
+			this.from = from;
+			this.to = to;
+			candidateIDs = new int[to - from];
+			order = new long[to - from];
+		}
+		
+		// starts the search for a node similar to edit
+		private void setEditNode(ASTNode edit) {
+			this.edit = edit;
+			editChars = lowerCase(edit.content(), editChars);
+			// a line that fits in a word is compared in a few word operations, faster than a lookup
+			distances = edit.content().length() > MyersKernel.MAX_LENGTH ? memo.line(edit.content()) : null;
+			candidateCount = candidates();
+		}
+		
+		/**
+		 * Finds the base node most similar to the edit node among the candidates with ids in
+		 * [from, to) in the region, other than those in [skipFrom, skipTo) (which were searched
+		 * already).
+		 * Of equally similar nodes, the first in pre-order is chosen. Whitespace is matched to
+		 * the first unmatched whitespace.
+		 * 
+		 * Candidates are compared in order of their difference in length to the edit node, which
+		 * bounds their similarity from below, so the search stops at the first candidate that
+		 * can't be as similar as the best one so far.
+		 * 
+		 * @param matchedIDs - ids of the base nodes matched so far
+		 * @param parent - if not null, only children of parent are searched
+		 * @return the most similar base node, or null if none is similar enough to be matched
+		 */
+		private ASTNode bestMatch(BitSet matchedIDs, ASTNode parent, int from, int to,
+				int skipFrom, int skipTo) {
+			int editLength = edit.content().length();
+			int count = 0;
+			int i = Arrays.binarySearch(candidateIDs, 0, candidateCount, Math.max(from, this.from));
+			for (i = i < 0 ? -i - 1 : i; i < candidateCount && candidateIDs[i] < Math.min(to, this.to); i++) {
+				int id = candidateIDs[i];
+				ASTNode base = matches.getBaseNode(id);
 				
-				// can't be matched, skip
-				if (matchedIDs.contains(base.getID()) || base.getType() != edit.getType()) 
+				// can't be matched or searched already, skip
+				if ((id >= skipFrom && id < skipTo) || (parent != null && base.getParent() != parent) ||
+						matchedIDs.get(id) || base.getType() != edit.getType()) 
 					continue;
 				
 				if (base.getType() == ASTNode.Type.WHITESPACE) {
-					int id = base.getID();
-					matches.get(id).setEditNode(edit, isLocal);
-					matchedIDs.add(id);
-					break;
-				}
-				
-				if (base.isLeafNode() && compareLeafNodes(base, edit) < minSimilarity) {
-					minSimilarity = compareLeafNodes(base, edit);
-					bestMatch = base;
+					return base;
 				}
 				
-				if (!base.isLeafNode() && compareInnerNodes(base, edit) < minSimilarity) {
-					minSimilarity = compareInnerNodes(base, edit);
-					bestMatch = base;
-				}
+				// sorts by difference in length, then by id
+				long difference = Math.abs(base.content().length() - editLength);
+				order[count++] = difference << 32 | id;
+			}
+			Arrays.sort(order, 0, count);
+			
+			double minSimilarity = 1.0;
+			ASTNode bestMatch = null;
+			for (i = 0; i < count; i++) {
+				int difference = (int) (order[i] >>> 32);
+				int id = (int) order[i];
 				
-				/*if ((base.getType() == ASTNode.Type.WHITESPACE) || 
-						(base.isLeafNode() && compareLeafNodes(base, edit)) ||
-						(!base.isLeafNode() && compareInnerNodes(base, edit))) {
-					// it's a match
-					int id = base.getID();
-					matches.get(id).setEditNode(edit, isLocal);
-					matchedIDs.add(id);
+				// the similarity of this and every later candidate is at least difference / (editLength + difference)
+				if (difference > 0 && (double) difference / (editLength + difference) > Math.min(minSimilarity, SIM_THRESHOLD))
 					break;
-				}*/	
 				
+				// an equally similar node only replaces the best one if it comes first in pre-order
+				ASTNode base = matches.getBaseNode(id);
+				boolean orEqual = bestMatch != null && id < bestMatch.getID();
+				double similarity = base.isLeafNode() ?
+						compareLeafNodes(base, edit, minSimilarity, orEqual) : compareInnerNodes(base, edit, minSimilarity, orEqual);
+				if (similarity < minSimilarity || (orEqual && similarity == minSimilarity)) {
+					minSimilarity = similarity;
+					bestMatch = base;
+				}
 			}
-			if (minSimilarity <= SIM_THRESHOLD) {
-				int id = bestMatch.getID();
-				matches.get(id).setEditNode(edit, isLocal);
-				matchedIDs.add(id);
-			} else if (edit.getID() < 0) {
-				// no possible match found, create new one
-				matches.add(new Match(nextID++).setEditNode(edit, isLocal));
+			return minSimilarity <= SIM_THRESHOLD ? bestMatch : null;
+		}
+		
+		// puts the ids of the base nodes that may be similar enough to the edit node to be
+		// matched in candidateIDs, in pre-order, and returns how many there are
+		private int candidates() {
+			int editLength = edit.content().length();
+			if (edit.getType() == ASTNode.Type.WHITESPACE || editLength < MIN_INDEXED_LENGTH) {
+				// only nodes of the same type can be matched
+				int[] ids = baseTree.indicesOf(edit.getType());
+				int count = 0;
+				int i = Arrays.binarySearch(ids, from);
+				for (i = i < 0 ? -i - 1 : i; i < ids.length && ids[i] < to; i++) {
+					candidateIDs[count++] = ids[i];
+				}
+				return count;
 			}
+			
+			GramIndex gramIndex = gramIndex();
+			if (grams == null) grams = new GramIndex.Result(from, to);
+			int found = gramIndex.search(editChars, editLength, grams);
+			int[] ids = grams.found();
+			Arrays.sort(ids, 0, found);
+			int count = 0;
+			for (int i = 0; i < found; i++) {
+				int id = ids[i];
+				if (grams.shared(id) >= gramBound(Math.max(gramIndex.length(id), editLength))) {
+					candidateIDs[count++] = id;
+				}
+			}
+			return count;
+		}
+		
+		// returns the similarity of these leaf nodes if it is below best (or equal to it, if orEqual)
+		// and at most SIM_THRESHOLD (so they may be matched), otherwise infinity
+		private double compareLeafNodes(ASTNode base, ASTNode edit, double best, boolean orEqual) {
+			return similarity(base, edit, best, orEqual);
+		}
+		
+		// returns the similarity of these non-leaf nodes if it is below best (or equal to it, if orEqual)
+		// and at most SIM_THRESHOLD (so they may be matched), otherwise infinity
+		// in the future change to comparing nodes?
+		private double compareInnerNodes(ASTNode base, ASTNode edit, double best, boolean orEqual) {
+			return similarity(base, edit, best, orEqual);
+		}
+		
+		// the similarity of two nodes is the edit distance of their content over the longer length
+		private double similarity(ASTNode base, ASTNode edit, double best, boolean orEqual) {
+			int baseLength = base.content().length();
+			int editLength = edit.content().length();
+			int maxLength = Math.max(baseLength, editLength);
+			if (maxLength == 0) return Double.POSITIVE_INFINITY;
+			
+			int limit = distanceLimit(maxLength, best, orEqual);
+			if (Math.abs(baseLength - editLength) > limit) {
+				// the distance is at least the difference in length
+				return Double.POSITIVE_INFINITY;
+			}
+			boolean memoized = distances != null && baseLength > MyersKernel.MAX_LENGTH;
+			int distance = memoized ? distances.get(base.getID(), limit) : -1;
+			if (distance < 0) {
+				distance = kernel.distance(baseChars[base.getID()], baseLength, editChars, editLength, limit);
+				if (memoized) distances.put(base.getID(), distance, limit);
+			}
+			return distance <= limit ? (double) distance / maxLength : Double.POSITIVE_INFINITY;
 		}
 	}
 	
-	private void labelBaseTree(AST baseTree) {
-		nextID = 0;
-		for (ASTNode node : baseTree) {
-			matches.add(new Match(nextID++).setBaseNode(node));
-		}
-	}
-	
-	// return true iff these leaf nodes should be matched
-	private double compareLeafNodes(ASTNode n1, ASTNode n2) {
-		return (double) distance(n1.getContent(), n2.getContent()) / Math.max(n1.getContent().length(), n2.getContent().length());
-	}
-	
-	// return true iff these non-leaf nodes should be matched
-	// in the future change to comparing nodes?
-	private double compareInnerNodes(ASTNode n1, ASTNode n2) {
-		return (double) distance(n1.getContent(), n2.getContent()) / Math.max(n1.getContent().length(), n2.getContent().length());
-	}
-	
-	// calculates Levenshtein distance between two strings
-	private static int distance(String a, String b) {
-	    a = a.toLowerCase();
-	    b = b.toLowerCase();
-	    // i == 0
-	    int [] costs = new int [b.length() + 1];
-	    for (int j = 0; j < costs.length; j++) {
-	        costs[j] = j;
-	    }
-	    for (int i = 1; i <= a.length(); i++) {
-	        // j == 0; nw = lev(i - 1, j)
-	        costs[0] = i;
-	        int nw = i - 1;
-	        for (int j = 1; j <= b.length(); j++) {
-	            int cj = Math.min(1 + Math.min(costs[j], costs[j - 1]), a.charAt(i - 1) == b.charAt(j - 1) ? nw : nw + 1);
-	            nw = costs[j];
-	            costs[j] = cj;
-	        }
-	    }
-	    return costs[b.length()];
+	/**
+	 * Unmatched base nodes (or subtrees) by a hash of their contents, for matchIdentical and
+	 * matchSubtrees. They are also indexed by their parent and by their position among their
+	 * siblings, so the base node of highest score (see score) for an edit node is looked up
+	 * directly rather than by going through every identical node. Matched nodes are skipped
+	 * once they are reached, rather than removed.
+	 */
+	private class IdenticalIndex {
+		
+		private final BitSet matchedIDs;
+		private final boolean subtrees; // whether whole subtrees are matched
+		
+		// the candidates by hash and parent id and position, by hash and parent id, by hash
+		// and position, and by hash
+		private final Map<Long, Candidates> byParentAndPosition = new HashMap<>();
+		private final Map<Long, Candidates> byParent = new HashMap<>();
+		private final Map<Long, Candidates> byPosition = new HashMap<>();
+		private final Map<Long, Candidates> byHash = new HashMap<>();
+		
+		private IdenticalIndex(BitSet matchedIDs, boolean subtrees) {
+			this.matchedIDs = matchedIDs;
+			this.subtrees = subtrees;
+		}
+		
+		// adds a base node with the given hash; nodes are added in pre-order
+		private void add(ASTNode base, int hash) {
+			int parentID = base.getParent().getID();
+			int position = basePositions[base.getID()];
+			add(byParentAndPosition, key(key(hash, parentID), position), base);
+			add(byParent, key(hash, parentID), base);
+			add(byPosition, key(hash, position), base);
+			add(byHash, hash, base);
+		}
+		
+		private void add(Map<Long, Candidates> index, long key, ASTNode base) {
+			index.computeIfAbsent(key, k -> new Candidates()).nodes.add(base);
+		}
+		
+		// returns the unmatched base node identical to edit (which has the given hash and
+		// position) of highest score, the first in pre-order of those, or null if there is none
+		private ASTNode best(ASTNode edit, int hash, int editPosition) {
+			int parentID = edit.getParent().getID();
+			ASTNode best = null;
+			if (parentID >= 0) {
+				best = first(byParentAndPosition.get(key(key(hash, parentID), editPosition)), edit, editPosition, 3);
+				if (best == null) best = first(byParent.get(key(hash, parentID)), edit, editPosition, 2);
+			}
+			if (best == null) best = first(byPosition.get(key(hash, editPosition)), edit, editPosition, 1);
+			if (best == null) best = first(byHash.get((long) hash), edit, editPosition, 0);
+			return best;
+		}
+		
+		// returns the first candidate identical to edit with at least the given score, or null
+		private ASTNode first(Candidates candidates, ASTNode edit, int editPosition, int score) {
+			if (candidates == null) return null;
+			List<ASTNode> nodes = candidates.nodes;
+			while (candidates.first < nodes.size() && matched(nodes.get(candidates.first))) {
+				candidates.first++;
+			}
+			for (int i = candidates.first; i < nodes.size(); i++) {
+				ASTNode base = nodes.get(i);
+				// matched, hash collision, or found in a list by a key that collided
+				if (matched(base) || !identical(base, edit) || score(base, edit, editPosition) < score) continue;
+				return base;
+			}
+			return null;
+		}
+		
+		// returns true iff the base node (or part of its subtree, with an enclosing one) is matched
+		private boolean matched(ASTNode base) {
+			return subtrees ? !unmatched(base, matchedIDs) : matchedIDs.get(base.getID());
+		}
+		
+		private boolean identical(ASTNode base, ASTNode edit) {
+			return subtrees ? base.subtreeEquals(edit) : base.getType() == edit.getType() && base.contentEquals(edit);
+		}
+	}
+	
+	// combines a hash with another value into a key
+	private static long key(long hash, int value) {
+		return hash * 0x100000001L + value;
+	}
+	
+	// base nodes with the same key, in pre-order; the ones before first are matched
+	private static class Candidates {
+		private final List<ASTNode> nodes = new ArrayList<>(2);
+		private int first;
+	}
+	
+	// edit nodes matched among the base nodes [from, to), the subtree of the base node matched to root
+	private static class Region {
+		private final ASTNode root;
+		private final int from;
+		private final int to;
+		
+		private final List<Integer> nodes = new ArrayList<>(); // indices of the edit nodes, in pre-order
+		private BitSet claims; // ids of the matched base nodes in the region
+		private List<Integer> left; // indices of the edit nodes left unmatched
+		
+		private Region(ASTNode root, int from, int to) {
+			this.root = root;
+			this.from = from;
+			this.to = to;
+		}
 	}
 }
@@ -0,0 +1,64 @@
+package smerge.diff;
+
+/**
+ * A bit-parallel DistanceKernel (Myers' algorithm, as formulated by Hyyrö) for lines where
+ * the shorter one has at most 64 characters. A column of the Levenshtein matrix is kept as
+ * the bit vectors of its vertical deltas, one bit per character of the shorter line, so each
+ * character of the longer line costs a handful of word operations.
+ * 
+ * @author Alva Wei, Jediah Conachan
+ */
+public class MyersKernel implements DistanceKernel {
+	
+	/**
+	 * The longest line that fits in a word
+	 */
+	public static final int MAX_LENGTH = 64;
+	
+	private final PatternTable table = new PatternTable();
+	
+	/**
+	 * Computes the distance as specified by DistanceKernel
+	 * @throws IllegalArgumentException if both lines are longer than MAX_LENGTH
+	 */
+	@Override
+	public int distance(char[] a, int aLength, char[] b, int bLength, int limit) {
+		// the shorter line is the pattern, encoded as bits
+		if (aLength > bLength) return distance(b, bLength, a, aLength, limit);
+		if (aLength > MAX_LENGTH) throw new IllegalArgumentException("both lines are longer than " + MAX_LENGTH);
+		if (aLength == 0) return bLength;
+		if (bLength - aLength > limit) return limit + 1;
+		
+		table.build(a, aLength, 1);
+		long[] masks = table.masks();
+		long pv = -1L; // vertical deltas of +1
+		long mv = 0;   // vertical deltas of -1
+		long last = 1L << (aLength - 1);
+		int score = aLength;
+		for (int j = 0; j < bLength; j++) {
+			long eq = masks[table.slot(b[j])];
+			long xv = eq | mv;
+			long xh = (((eq & pv) + pv) ^ pv) | eq;
+			long ph = mv | ~(xh | pv);
+			long mh = pv & xh;
+			if ((ph & last) != 0) {
+				score++;
+			} else if ((mh & last) != 0) {
+				score--;
+			}
+			// the first row of the matrix grows by one every column
+			ph = (ph << 1) | 1;
+			mh <<= 1;
+			pv = mh | ~(xv | ph);
+			mv = ph & xv;
+			
+			// each remaining column lowers the score by at most one
+			if (score - (bLength - j - 1) > limit) {
+				score = limit + 1;
+				break;
+			}
+		}
+		table.clear(a, aLength);
+		return score;
+	}
+}
@@ -0,0 +1,109 @@
+package smerge.diff;
+
+import java.util.ArrayDeque;
+import java.util.Arrays;
+import java.util.Deque;
+import java.util.HashMap;
+import java.util.Map;
+
+/**
+ * Patience diff of two sequences of keys, as used by git diff --patience. Equal keys at the
+ * start and end of the sequences are matched, then the keys that occur exactly once in
+ * each sequence are matched where they are in the same order (the longest increasing
+ * subsequence), and the ranges between those anchors are diffed the same way.
+ *
+ * The matches never cross: if a[i] is matched to b[j] and a[k] to b[l], i < k iff j < l.
+ *
+ * @author Alva Wei, Jediah Conachan
+ */
+final class PatienceDiff {
+
+	private PatienceDiff() {}
+
+	// returns the index of the element of b each element of a is matched to, or -1
+	static int[] match(int[] a, int[] b) {
+		int[] matchOf = new int[a.length];
+		Arrays.fill(matchOf, -1);
+
+		// ranges a[aLow, aHigh) and b[bLow, bHigh) left to diff
+		Deque<int[]> ranges = new ArrayDeque<>();
+		ranges.push(new int[] {0, a.length, 0, b.length});
+		while (!ranges.isEmpty()) {
+			int[] range = ranges.pop();
+			int aLow = range[0], aHigh = range[1], bLow = range[2], bHigh = range[3];
+			while (aLow < aHigh && bLow < bHigh && a[aLow] == b[bLow]) {
+				matchOf[aLow++] = bLow++;
+			}
+			while (aLow < aHigh && bLow < bHigh && a[aHigh - 1] == b[bHigh - 1]) {
+				matchOf[--aHigh] = --bHigh;
+			}
+			if (aLow == aHigh || bLow == bHigh) continue;
+
+			int[] anchors = uniqueAnchors(a, aLow, aHigh, b, bLow, bHigh);
+			int i = aLow;
+			int j = bLow;
+			for (int k = 0; k < anchors.length; k += 2) {
+				matchOf[anchors[k]] = anchors[k + 1];
+				ranges.push(new int[] {i, anchors[k], j, anchors[k + 1]});
+				i = anchors[k] + 1;
+				j = anchors[k + 1] + 1;
+			}
+			if (anchors.length > 0) ranges.push(new int[] {i, aHigh, j, bHigh});
+		}
+		return matchOf;
+	}
+
+	// returns the pairs of indices (i, j) of keys that occur once in each range, in the longest
+	// sequence in which both indices increase, flattened into i0, j0, i1, j1, ...
+	private static int[] uniqueAnchors(int[] a, int aLow, int aHigh, int[] b, int bLow, int bHigh) {
+		// for each key: its count in a, its index in a, its count in b, its index in b
+		Map<Integer, int[]> occurrences = new HashMap<>();
+		for (int i = aLow; i < aHigh; i++) {
+			int[] o = occurrences.computeIfAbsent(a[i], k -> new int[4]);
+			o[0]++;
+			o[1] = i;
+		}
+		for (int j = bLow; j < bHigh; j++) {
+			int[] o = occurrences.get(b[j]);
+			if (o == null) continue;
+			o[2]++;
+			o[3] = j;
+		}
+
+		// the unique pairs in the order of a
+		int[] is = new int[aHigh - aLow];
+		int[] js = new int[aHigh - aLow];
+		int count = 0;
+		for (int i = aLow; i < aHigh; i++) {
+			int[] o = occurrences.get(a[i]);
+			if (o[0] == 1 && o[2] == 1) {
+				is[count] = i;
+				js[count++] = o[3];
+			}
+		}
+
+		// patience sorting: tails[p] is the pair ending the best increasing sequence of length p + 1
+		int[] tails = new int[count];
+		int[] previous = new int[count];
+		int length = 0;
+		for (int k = 0; k < count; k++) {
+			int low = 0;
+			int high = length;
+			while (low < high) {
+				int mid = (low + high) >>> 1;
+				if (js[tails[mid]] < js[k]) low = mid + 1;
+				else high = mid;
+			}
+			previous[k] = low > 0 ? tails[low - 1] : -1;
+			tails[low] = k;
+			if (low == length) length++;
+		}
+
+		int[] anchors = new int[2 * length];
+		for (int k = length > 0 ? tails[length - 1] : -1, p = length - 1; k >= 0; k = previous[k], p--) {
+			anchors[2 * p] = is[k];
+			anchors[2 * p + 1] = js[k];
+		}
+		return anchors;
+	}
+}
@@ -0,0 +1,72 @@
+package smerge.diff;
+
+import java.util.Arrays;
+
+/**
+ * Maps the characters of a pattern to the bit masks of their positions in it, for the
+ * bit-parallel kernels. Each distinct character gets a slot of one mask per block of 64
+ * positions; slot 0 belongs to every character not in the pattern and is all zeros.
+ * ASCII characters find their slot by index, others by a scan of the pattern's few
+ * non-ASCII characters.
+ * 
+ * @author Alva Wei, Jediah Conachan
+ */
+class PatternTable {
+	
+	private final int[] asciiSlots = new int[128];
+	private char[] otherChars = new char[8];
+	private int[] otherSlots = new int[8];
+	private int others;
+	
+	private long[] masks = new long[64];
+	private int slots;
+	private int blocks;
+	
+	// fills in the masks of pattern[0, length), split into the given number of blocks
+	void build(char[] pattern, int length, int blocks) {
+		this.blocks = blocks;
+		slots = 1;
+		if (masks.length < (length + 1) * blocks) masks = new long[(length + 1) * blocks];
+		Arrays.fill(masks, 0, blocks, 0);
+		for (int i = 0; i < length; i++) {
+			char c = pattern[i];
+			int slot = slot(c);
+			if (slot == 0) {
+				slot = slots++;
+				Arrays.fill(masks, slot * blocks, (slot + 1) * blocks, 0);
+				if (c < 128) {
+					asciiSlots[c] = slot;
+				} else {
+					if (others == otherChars.length) {
+						otherChars = Arrays.copyOf(otherChars, others * 2);
+						otherSlots = Arrays.copyOf(otherSlots, others * 2);
+					}
+					otherChars[others] = c;
+					otherSlots[others++] = slot;
+				}
+			}
+			masks[slot * blocks + (i >>> 6)] |= 1L << (i & 63);
+		}
+	}
+	
+	// returns the slot of c, whose masks start at slot * blocks
+	int slot(char c) {
+		if (c < 128) return asciiSlots[c];
+		for (int i = 0; i < others; i++) {
+			if (otherChars[i] == c) return otherSlots[i];
+		}
+		return 0;
+	}
+	
+	long[] masks() {
+		return masks;
+	}
+	
+	// forgets the pattern[0, length) the table was built from
+	void clear(char[] pattern, int length) {
+		for (int i = 0; i < length; i++) {
+			if (pattern[i] < 128) asciiSlots[pattern[i]] = 0;
+		}
+		others = 0;
+	}
+}
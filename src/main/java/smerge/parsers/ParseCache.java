@@ -0,0 +1,199 @@
+package smerge.parsers;
+
+import java.io.BufferedInputStream;
+import java.io.BufferedOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.IOException;
+import java.nio.ByteBuffer;
+import java.nio.charset.Charset;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.DirectoryStream;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.nio.file.StandardCopyOption;
+import java.nio.file.attribute.BasicFileAttributes;
+import java.nio.file.attribute.FileTime;
+import java.security.MessageDigest;
+import java.security.NoSuchAlgorithmException;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.List;
+import java.util.regex.Pattern;
+
+import smerge.ast.CompactAST;
+
+/**
+ * A ParseCache keeps parsed trees on disk, so that content parsed by an earlier run
+ * (e.g. the base of a conflict that git mergetool is run on again) is not parsed again.
+ * Entries are keyed by the git blob id (SHA-1) of the parsed bytes and hold the tree
+ * in CompactAST's binary form.
+ *
+ * The cache is bounded in size: once it grows past its limit, the least recently used
+ * entries are deleted. Only files named like entries count, so the cache can share its
+ * directory with other files, and entries still being written are left alone. A cache that can't be read or written is treated as a miss,
+ * so it never makes parsing fail.
+ *
+ * @author Jediah Conachan
+ */
+public class ParseCache {
+
+	// system properties read by getDefault()
+	public static final String DIR_PROPERTY = "smerge.cache.dir";
+	public static final String SIZE_PROPERTY = "smerge.cache.size"; // in megabytes
+
+	public static final long DEFAULT_MAX_BYTES = 64L << 20;
+
+	private static final char[] HEX = "0123456789abcdef".toCharArray();
+
+	// the names key() gives entries; other files in the directory are not the cache's
+	private static final Pattern ENTRY = Pattern.compile("[0-9a-f]{40}\\.\\w+\\.v\\d+\\.[\\w.:+-]+");
+
+	private final Path dir;
+	private final long maxBytes;
+
+	/**
+	 * Constructs a cache that stores its entries in dir
+	 * @param dir - directory to store entries in, created when the first entry is stored
+	 * @param maxBytes - the total size of the entries to keep
+	 */
+	public ParseCache(Path dir, long maxBytes) {
+		this.dir = dir;
+		this.maxBytes = maxBytes;
+	}
+
+	/**
+	 * Returns the cache configured by the smerge.cache.dir and smerge.cache.size
+	 * system properties, or null if smerge.cache.dir is not set
+	 */
+	public static ParseCache getDefault() {
+		String dir = System.getProperty(DIR_PROPERTY);
+		if (dir == null || dir.isEmpty()) return null;
+		long megabytes = Long.getLong(SIZE_PROPERTY, DEFAULT_MAX_BYTES >> 20);
+		return new ParseCache(Paths.get(dir), megabytes << 20);
+	}
+
+	/**
+	 * Returns the id git gives a blob holding the given bytes, i.e. the SHA-1 of
+	 * "blob <length>\0" followed by the bytes, in hex
+	 * @param bytes - the content of the blob, from its position to its limit
+	 */
+	public static String blobID(ByteBuffer bytes) {
+		MessageDigest sha;
+		try {
+			sha = MessageDigest.getInstance("SHA-1");
+		} catch (NoSuchAlgorithmException e) {
+			throw new IllegalStateException(e); // every Java platform supports SHA-1
+		}
+		sha.update(("blob " + bytes.remaining() + "\0").getBytes(StandardCharsets.US_ASCII));
+		sha.update(bytes.duplicate());
+		byte[] digest = sha.digest();
+		char[] hex = new char[digest.length * 2];
+		for (int i = 0; i < digest.length; i++) {
+			hex[2 * i] = HEX[(digest[i] >> 4) & 0xf];
+			hex[2 * i + 1] = HEX[digest[i] & 0xf];
+		}
+		return new String(hex);
+	}
+
+	/**
+	 * Returns the key of the tree that parser builds from the given encoded source. The key
+	 * includes the parser's version (see Parser.version), so trees cached by an older
+	 * version of the parser are not used.
+	 * @param bytes - the encoded source code
+	 * @param charset - the encoding of the source code
+	 * @param parser - the parser the tree is built by
+	 */
+	public static String key(ByteBuffer bytes, Charset charset, Parser parser) {
+		return blobID(bytes) + "." + parser.getClass().getSimpleName() + ".v" + parser.version() + "." + charset.name();
+	}
+
+	/**
+	 * Looks up a cached tree and marks it as recently used
+	 * @param key - the key of the tree (see key)
+	 * @return the cached tree, or null if there is none
+	 */
+	public CompactAST get(String key) {
+		Path entry = dir.resolve(key);
+		if (!Files.isRegularFile(entry)) return null;
+		try (DataInputStream in = new DataInputStream(new BufferedInputStream(Files.newInputStream(entry)))) {
+			CompactAST tree = CompactAST.read(in);
+			Files.setLastModifiedTime(entry, FileTime.fromMillis(System.currentTimeMillis()));
+			return tree;
+		} catch (IOException | RuntimeException e) {
+			// an unreadable or outdated entry, which put() will replace
+			return null;
+		}
+	}
+
+	/**
+	 * Stores a tree, then evicts the least recently used entries if the cache is full
+	 * @param key - the key of the tree (see key)
+	 * @param tree - the tree to store
+	 */
+	public void put(String key, CompactAST tree) {
+		Path temp = null;
+		try {
+			Files.createDirectories(dir);
+
+			// write to a temporary file first so other processes never read half an entry
+			temp = Files.createTempFile(dir, key, ".tmp");
+			try (DataOutputStream out = new DataOutputStream(new BufferedOutputStream(Files.newOutputStream(temp)))) {
+				tree.write(out);
+			}
+			Files.move(temp, dir.resolve(key), StandardCopyOption.REPLACE_EXISTING, StandardCopyOption.ATOMIC_MOVE);
+			evict();
+		} catch (IOException e) {
+			// the cache is only an optimization, so failing to store a tree is not an error
+		} finally {
+			if (temp != null) {
+				try {
+					Files.deleteIfExists(temp);
+				} catch (IOException e) {
+					// left behind, but never read or counted as an entry
+				}
+			}
+		}
+	}
+
+	// deletes the least recently used entries until the cache fits in maxBytes
+	private void evict() throws IOException {
+		List<Path> entries = new ArrayList<>();
+		List<BasicFileAttributes> attributes = new ArrayList<>();
+		long total = 0;
+		try (DirectoryStream<Path> stream = Files.newDirectoryStream(dir)) {
+			for (Path entry : stream) {
+				if (!isEntry(entry.getFileName().toString())) continue;
+				try {
+					BasicFileAttributes attrs = Files.readAttributes(entry, BasicFileAttributes.class);
+					if (!attrs.isRegularFile()) continue;
+					entries.add(entry);
+					attributes.add(attrs);
+					total += attrs.size();
+				} catch (IOException e) {
+					// deleted by another process in the meantime
+				}
+			}
+		}
+		if (total <= maxBytes) return;
+
+		Integer[] order = new Integer[entries.size()];
+		for (int i = 0; i < order.length; i++) order[i] = i;
+		Arrays.sort(order, (a, b) ->
+				attributes.get(a).lastModifiedTime().compareTo(attributes.get(b).lastModifiedTime()));
+		for (int i = 0; i < order.length && total > maxBytes; i++) {
+			try {
+				Files.deleteIfExists(entries.get(order[i]));
+				total -= attributes.get(order[i]).size();
+			} catch (IOException e) {
+				// in use or already gone, try the next one
+			}
+		}
+	}
+
+	// whether a file name is that of an entry, and not of one being written (see put)
+	private static boolean isEntry(String name) {
+		return !name.endsWith(".tmp") && ENTRY.matcher(name).matches();
+	}
+}
@@ -1,15 +1,44 @@
 package smerge.parsers;
 
+import java.io.BufferedWriter;
 import java.io.IOException;
+import java.io.InterruptedIOException;
+import java.io.UncheckedIOException;
+import java.io.Writer;
+import java.nio.ByteBuffer;
+import java.nio.MappedByteBuffer;
+import java.nio.channels.Channels;
+import java.nio.channels.FileChannel;
+import java.nio.channels.ReadableByteChannel;
+import java.nio.channels.WritableByteChannel;
+import java.nio.charset.Charset;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.nio.file.StandardOpenOption;
+import java.util.ArrayList;
+import java.util.Arrays;
+import java.util.List;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ExecutorService;
+import java.util.concurrent.Executors;
+import java.util.concurrent.Future;
 
 import smerge.ast.AST;
 import smerge.ast.ASTNode;
+import smerge.ast.CompactAST;
+import smerge.ast.SourceSlice;
 
 
 /**
  * This class acts as an interface for all Parser classes (see PythonParser), and as
  * an abstract class for helper methods.
  * 
+ * Parsers keep no state between calls, so a single instance may parse several
+ * inputs at the same time (see parseAll). A parser may be given a ParseCache,
+ * which it then looks encoded source code up in before parsing it.
+ * 
  * @author Jediah Conachan
  */
 
@@ -20,31 +49,238 @@ public abstract class Parser {
 	 * @return the correct parser
 	 */
 	public static Parser getInstance(String filename) {
-		if (filename.endsWith(".py")) return new PythonParser();
-		throw new IllegalArgumentException("Parsing is not supported for this file type: " + filename);
+		Parser parser;
+		if (filename.endsWith(".py")) {
+			parser = new PythonParser();
+		} else {
+			throw new IllegalArgumentException("Parsing is not supported for this file type: " + filename);
+		}
+		parser.setCache(ParseCache.getDefault());
+		return parser;
+	}
+	
+	// trees parsed before, or null if they aren't cached
+	private ParseCache cache;
+	
+	// files at least this large (in bytes) are memory-mapped rather than read onto the heap
+	public static final long MAP_THRESHOLD = 1 << 20;
+	
+	// indentation is written from this run of spaces, and indent() returns its prefixes
+	private static final String SPACES;
+	private static final String[] INDENTS = new String[128];
+	static {
+		char[] spaces = new char[INDENTS.length];
+		Arrays.fill(spaces, ' ');
+		SPACES = new String(spaces);
+		for (int i = 0; i < INDENTS.length; i++) {
+			INDENTS[i] = SPACES.substring(0, i);
+		}
 	}
 	
 	/**
-	 * Parses the given file into an AST
+	 * Parses the given UTF-8 file into an AST. Large files are memory-mapped (see parseMapped).
 	 * @param filename - the filename of the file to parse
 	 * @return an AST representation of the file's source code
 	 * @throws IOException if there is an error reading the file
 	 */
-	public abstract AST parse(String filename) throws IOException;
+	public AST parse(String filename) throws IOException {
+		Path path = Paths.get(filename);
+		if (Files.size(path) >= MAP_THRESHOLD) {
+			return parseMapped(filename);
+		}
+		return parse(Files.readAllBytes(path), StandardCharsets.UTF_8);
+	}
+	
+	/**
+	 * Parses the given UTF-8 file into an AST by memory-mapping it. The file is decoded
+	 * once into a single character buffer, which the lexer then works on directly.
+	 * @param filename - the filename of the file to parse
+	 * @return an AST representation of the file's source code
+	 * @throws IOException if there is an error reading the file
+	 */
+	public AST parseMapped(String filename) throws IOException {
+		try (FileChannel channel = FileChannel.open(Paths.get(filename), StandardOpenOption.READ)) {
+			MappedByteBuffer bytes = channel.map(FileChannel.MapMode.READ_ONLY, 0, channel.size());
+			return parseBytes(bytes, StandardCharsets.UTF_8);
+		}
+	}
+	
+	/**
+	 * Parses the given files concurrently, each on its own thread.
+	 * Node ids only depend on each file's content, not on which file finishes first.
+	 * @param filenames - the filenames of the files to parse
+	 * @return the ASTs of the files, in the same order as filenames
+	 * @throws IOException if there is an error reading any of the files
+	 */
+	public AST[] parseAll(String... filenames) throws IOException {
+		int threads = Math.max(1, Math.min(filenames.length, Runtime.getRuntime().availableProcessors()));
+		ExecutorService executor = Executors.newFixedThreadPool(threads);
+		try {
+			List<Future<AST>> futures = new ArrayList<>();
+			for (String filename : filenames) {
+				futures.add(executor.submit(() -> parse(filename)));
+			}
+			AST[] trees = new AST[filenames.length];
+			for (int i = 0; i < trees.length; i++) {
+				trees[i] = futures.get(i).get();
+			}
+			return trees;
+		} catch (InterruptedException e) {
+			Thread.currentThread().interrupt();
+			throw new InterruptedIOException("interrupted while parsing");
+		} catch (ExecutionException e) {
+			Throwable cause = e.getCause();
+			if (cause instanceof IOException) throw (IOException) cause;
+			if (cause instanceof RuntimeException) throw (RuntimeException) cause;
+			if (cause instanceof Error) throw (Error) cause;
+			throw new IllegalStateException(cause);
+		} finally {
+			executor.shutdownNow();
+		}
+	}
+	
+	/**
+	 * Parses the given encoded source code into an AST
+	 * @param source - the bytes of the source code
+	 * @param charset - the encoding of the source code
+	 * @return an AST representation of the source code
+	 */
+	public AST parse(byte[] source, Charset charset) {
+		return parseBytes(ByteBuffer.wrap(source), charset);
+	}
+	
+	/**
+	 * Reads the given channel to its end and parses what was read into an AST
+	 * @param channel - the channel to read source code from
+	 * @param charset - the encoding of the source code
+	 * @return an AST representation of the source code
+	 * @throws IOException if there is an error reading from the channel
+	 */
+	public AST parse(ReadableByteChannel channel, Charset charset) throws IOException {
+		ByteBuffer buffer = ByteBuffer.allocate(8192);
+		while (channel.read(buffer) >= 0) {
+			if (!buffer.hasRemaining()) {
+				ByteBuffer larger = ByteBuffer.allocate(buffer.capacity() * 2);
+				buffer.flip();
+				larger.put(buffer);
+				buffer = larger;
+			}
+		}
+		buffer.flip();
+		return parseBytes(buffer, charset);
+	}
+	
+	// decodes and parses source code, or takes its tree from the cache if it is there
+	private AST parseBytes(ByteBuffer bytes, Charset charset) {
+		if (cache == null) return parseSource(charset.decode(bytes));
+		
+		String key = ParseCache.key(bytes, charset, this);
+		CompactAST tree = cache.get(key);
+		if (tree == null) {
+			tree = parseCompact(charset.decode(bytes));
+			cache.put(key, tree);
+		}
+		return tree.toAST(this);
+	}
+	
+	/**
+	 * Sets the cache that encoded source code is looked up in before it is parsed
+	 * @param cache - the cache to use, or null to always parse
+	 */
+	public void setCache(ParseCache cache) {
+		this.cache = cache;
+	}
+	
+	/**
+	 * @return the cache this parser uses, or null if it has none
+	 */
+	public ParseCache getCache() {
+		return cache;
+	}
+	
+	/**
+	 * Parses the given source code into an AST. Unlike parse(String), the argument
+	 * is the source code itself rather than a filename.
+	 * @param source - the source code to parse
+	 * @return an AST representation of the source code
+	 */
+	public AST parseSource(CharSequence source) {
+		return parseCompact(source).toAST(this);
+	}
+	
+	/**
+	 * Parses the given source code into a compact tree (see CompactAST)
+	 * @param source - the source code to parse
+	 * @return a CompactAST representation of the source code
+	 */
+	public abstract CompactAST parseCompact(CharSequence source);
+	
+	/**
+	 * Returns the version of the trees this parser builds, which is part of the key of
+	 * cached trees (see ParseCache.key). It must change whenever the trees the parser builds
+	 * from a source do, so that trees cached by an older version are parsed again.
+	 * @return the version of this parser's output
+	 */
+	public abstract int version();
 	
 	/**
 	 * Unparses the given AST back into source code
 	 * @param tree - the AST to be unparsed
 	 * @return a String representation of source code
 	 */
-	public abstract String unparse(AST tree);
+	public String unparse(AST tree) {
+		StringBuilder sb = new StringBuilder();
+		try {
+			unparse(tree, sb);
+		} catch (IOException e) {
+			throw new UncheckedIOException(e); // StringBuilders don't throw
+		}
+		return sb.toString();
+	}
 	
 	/**
 	 * Unparses the given ASTNode back into source code
 	 * @param node - the root of the subtree to be unparsed
-	 * @return a String representation of source code
+	 * @param sb - to append the source code to
 	 */
-	public abstract void unparse(ASTNode node, StringBuilder sb);
+	public void unparse(ASTNode node, StringBuilder sb) {
+		try {
+			unparse(node, (Appendable) sb);
+		} catch (IOException e) {
+			throw new UncheckedIOException(e); // StringBuilders don't throw
+		}
+	}
+	
+	/**
+	 * Unparses the given AST back into source code, encoding it onto a channel.
+	 * The channel is not closed.
+	 * @param tree - the AST to be unparsed
+	 * @param channel - to write the encoded source code to
+	 * @param charset - the encoding to write the source code in
+	 * @throws IOException if there is an error writing to the channel
+	 */
+	public void unparse(AST tree, WritableByteChannel channel, Charset charset) throws IOException {
+		Writer out = new BufferedWriter(Channels.newWriter(channel, charset.newEncoder(), -1), 1 << 16);
+		unparse(tree, out);
+		out.flush();
+	}
+	
+	/**
+	 * Unparses the given AST back into source code, writing it to out as it goes.
+	 * No String of the whole source code is built, so out should be buffered.
+	 * @param tree - the AST to be unparsed
+	 * @param out - to write the source code to
+	 * @throws IOException if out throws one
+	 */
+	public abstract void unparse(AST tree, Appendable out) throws IOException;
+	
+	/**
+	 * Unparses the given ASTNode back into source code, writing it to out as it goes
+	 * @param node - the root of the subtree to be unparsed
+	 * @param out - to write the source code to
+	 * @throws IOException if out throws one
+	 */
+	public abstract void unparse(ASTNode node, Appendable out) throws IOException;
 	
 	
 	/**
@@ -53,10 +289,23 @@ public abstract class Parser {
 	 * @return a String with the given number of spaces
 	 */
 	public String indent(int numSpaces) {
-		String s = "";
-		for (int i = 0; i < numSpaces; i++) {
-			s += " ";
+		if (numSpaces < INDENTS.length) return INDENTS[Math.max(numSpaces, 0)];
+		StringBuilder sb = new StringBuilder(numSpaces);
+		for (int i = 0; i < numSpaces; i++) sb.append(' ');
+		return sb.toString();
+	}
+	
+	/**
+	 * Helper method. Writes the given number of spaces to out without building a String of them.
+	 * @param out - to write the spaces to
+	 * @param numSpaces - number of spaces
+	 * @throws IOException if out throws one
+	 */
+	protected static void writeIndent(Appendable out, int numSpaces) throws IOException {
+		while (numSpaces > 0) {
+			int n = Math.min(numSpaces, SPACES.length());
+			SourceSlice.write(out, SPACES, 0, n);
+			numSpaces -= n;
 		}
-		return s;
 	}
 }
@@ -0,0 +1,224 @@
+package smerge.parsers;
+
+/**
+ * This class splits Python source code into the line tokens that PythonParser builds
+ * its tree from. A token is a logical line: one physical line, extended over the following
+ * lines while a bracket or string is still open or the line ends with a backslash.
+ *
+ * The source is scanned exactly once and tokens are reported as offsets into it, so
+ * no text is copied while lexing.
+ *
+ * @author Jediah Conachan
+ */
+public class PythonLexer {
+
+	private final CharSequence source;
+	private final int length;
+
+	private int position; // start of the next token
+	private int start;    // start of the current token
+	private int end;      // end of the current token (exclusive, before the line break)
+
+	/**
+	 * Constructs a lexer over the given source code
+	 * @param source - the source code to split into tokens
+	 */
+	public PythonLexer(CharSequence source) {
+		this.source = source;
+		this.length = source.length();
+	}
+
+	/**
+	 * Constructs a lexer over the given source code that starts lexing at an offset
+	 * @param source - the source code to split into tokens
+	 * @param start - offset of the first token, which must be the start of a line
+	 */
+	public PythonLexer(CharSequence source, int start) {
+		this(source);
+		if (start < 0 || start > length) throw new IndexOutOfBoundsException("start " + start);
+		this.position = start;
+	}
+
+	/**
+	 * Advances to the next token.
+	 * @return true iff there was another token
+	 */
+	public boolean next() {
+		if (position >= length) return false;
+
+		start = position;
+		int depth = 0; // number of open brackets
+		int i = position;
+		while (i < length) {
+			char c = source.charAt(i);
+			if (c == '\n' || c == '\r') {
+				if (depth == 0) break;
+				i++;
+			} else if (c == '#') {
+				i = skipComment(i);
+			} else if (c == '\\') {
+				i = skipBackslash(i);
+			} else if (c == '"' || c == '\'') {
+				i = skipString(i);
+			} else if (c == '(' || c == '[' || c == '{') {
+				depth++;
+				i++;
+			} else if (c == ')' || c == ']' || c == '}') {
+				if (depth > 0) depth--;
+				i++;
+			} else {
+				i++;
+			}
+		}
+		end = i;
+		position = skipNewline(i);
+		
+		// a bracket or string left open at the end of the file ends the token there
+		while (end > start && (source.charAt(end - 1) == '\n' || source.charAt(end - 1) == '\r')) end--;
+		return true;
+	}
+
+	/**
+	 * @return the offset the next token will start at
+	 */
+	public int getPosition() {
+		return position;
+	}
+
+	/**
+	 * @return the offset of the first character of the current token
+	 */
+	public int getStart() {
+		return start;
+	}
+
+	/**
+	 * @return the offset just past the last character of the current token
+	 */
+	public int getEnd() {
+		return end;
+	}
+
+	/**
+	 * Returns the text of the current token. Line breaks inside the token are
+	 * normalized to "\n", the same way BufferedReader.readLine() would split them.
+	 * @return the current token
+	 */
+	public String getToken() {
+		String token = source.subSequence(start, end).toString();
+		if (token.indexOf('\r') < 0) return token;
+		return token.replace("\r\n", "\n").replace('\r', '\n');
+	}
+
+	// returns the index after the line break at i (\n, \r\n or \r), or i if there is none
+	private int skipNewline(int i) {
+		if (i < length && source.charAt(i) == '\r') i++;
+		if (i < length && source.charAt(i) == '\n') i++;
+		return i;
+	}
+
+	// returns the index of the line break ending the comment at i
+	private int skipComment(int i) {
+		while (i < length && source.charAt(i) != '\n' && source.charAt(i) != '\r') i++;
+		return i;
+	}
+
+	// a backslash followed only by whitespace continues the token onto the next line
+	private int skipBackslash(int i) {
+		int j = i + 1;
+		while (j < length && source.charAt(j) <= ' ' && source.charAt(j) != '\n' && source.charAt(j) != '\r') j++;
+		if (j < length && (source.charAt(j) == '\n' || source.charAt(j) == '\r')) {
+			return skipNewline(j);
+		}
+		return j == length ? j : i + 1;
+	}
+
+	// returns the index after the string literal opening at i
+	// a backslash always protects the next character, which is also true of raw strings
+	// (r"\"" is a valid raw string), so raw strings need no special treatment here
+	private int skipString(int i) {
+		char quote = source.charAt(i);
+		boolean format = isFormatString(i);
+		boolean triple = i + 2 < length && source.charAt(i + 1) == quote && source.charAt(i + 2) == quote;
+		i += triple ? 3 : 1;
+		while (i < length) {
+			char c = source.charAt(i);
+			if (c == '\\') {
+				// skip the escaped character (a \r\n line break counts as one)
+				i++;
+				if (i + 1 < length && source.charAt(i) == '\r' && source.charAt(i + 1) == '\n') i++;
+				i++;
+			} else if (c == quote) {
+				if (!triple) return i + 1;
+				if (i + 2 < length && source.charAt(i + 1) == quote && source.charAt(i + 2) == quote) return i + 3;
+				i++;
+			} else if ((c == '\n' || c == '\r') && !triple) {
+				// unterminated string, let the line break end the token
+				return i;
+			} else if (format && c == '{') {
+				if (i + 1 < length && source.charAt(i + 1) == '{') {
+					i += 2;
+				} else {
+					i = skipField(i + 1, quote, triple);
+				}
+			} else {
+				i++;
+			}
+		}
+		return length;
+	}
+
+	// returns the index after the f-string replacement field starting at i
+	// replacement fields may contain brackets and nested strings of any quote type
+	private int skipField(int i, char quote, boolean triple) {
+		int depth = 0;
+		while (i < length) {
+			char c = source.charAt(i);
+			if (c == '"' || c == '\'') {
+				i = skipString(i);
+				continue;
+			}
+			if ((c == '\n' || c == '\r') && !triple) return i;
+			if (c == '(' || c == '[' || c == '{') {
+				depth++;
+			} else if (c == ')' || c == ']') {
+				if (depth > 0) depth--;
+			} else if (c == '}') {
+				if (depth == 0) return i + 1;
+				depth--;
+			} else if (c == ':' && depth == 0) {
+				return skipFormatSpec(i + 1, quote, triple);
+			}
+			i++;
+		}
+		return length;
+	}
+
+	// returns the index after the format spec (the text after ':' in a replacement field)
+	// a format spec is literal text that may itself contain nested replacement fields
+	private int skipFormatSpec(int i, char quote, boolean triple) {
+		while (i < length) {
+			char c = source.charAt(i);
+			if (c == quote || ((c == '\n' || c == '\r') && !triple)) return i;
+			if (c == '{') {
+				i = skipField(i + 1, quote, triple);
+				continue;
+			}
+			if (c == '}') return i + 1;
+			i++;
+		}
+		return length;
+	}
+
+	// returns true iff the quote at i opens an f-string, e.g. f"..." or rf'...'
+	private boolean isFormatString(int i) {
+		boolean format = false;
+		int j = i - 1;
+		while (j >= 0 && i - j <= 2 && "rRbBuUfF".indexOf(source.charAt(j)) >= 0) {
+			format |= source.charAt(j) == 'f' || source.charAt(j) == 'F';
+			j--;
+		}
+		// a prefix must not be the end of a longer name, e.g. elif"..."
+		return format && (j < 0 || !(Character.isLetterOrDigit(source.charAt(j)) || source.charAt(j) == '_'));
+	}
+}
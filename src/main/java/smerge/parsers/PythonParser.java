@@ -1,14 +1,20 @@
 package smerge.parsers;
 
 import smerge.ast.AST;
+import smerge.ast.ASTBuilder;
 import smerge.ast.ASTNode;
+import smerge.ast.CompactAST;
+import smerge.ast.SourceSlice;
+import smerge.ast.TreeBuilder;
 
-import java.io.BufferedReader;
-import java.io.File;
-import java.io.FileReader;
 import java.io.IOException;
+import java.util.ArrayList;
 import java.util.Arrays;
-import java.util.Stack;
+import java.util.List;
+import java.util.concurrent.Callable;
+import java.util.concurrent.ExecutionException;
+import java.util.concurrent.ForkJoinPool;
+import java.util.concurrent.Future;
 
 /**
  * This class is responsible for parsing Python 3 files 
@@ -20,183 +26,315 @@ import java.util.Stack;
  */
 public class PythonParser extends Parser {
 	
-	// these are used to complete tokens
-	private static final String[] opens = {"\"\"\"", "'''", "\"", "'", "(", "[", "{"};
-	private static final String[] closes = {"\"\"\"", "'''", "\"", "'", ")", "]", "}"};	
+	// the version of the trees this parser builds: bump it whenever they change
+	private static final int VERSION = 1;
+	
+	// sources at least this long are parsed in parallel chunks
+	private final int chunkThreshold;
+	
+	/**
+	 * Constructs a parser that parses every source serially
+	 */
+	public PythonParser() {
+		this(Integer.MAX_VALUE);
+	}
+	
+	/**
+	 * Constructs a parser that splits sources of at least chunkThreshold characters into
+	 * chunks at top-level statements and parses the chunks in parallel. The trees it builds
+	 * are identical to the ones a serial parse builds, ids included.
+	 * @param chunkThreshold - the minimum source length to parse in parallel
+	 */
+	public PythonParser(int chunkThreshold) {
+		this.chunkThreshold = chunkThreshold;
+	}
+	
+	/**
+	 * Parses the given source code into an AST. Sources parsed serially are built as
+	 * ASTNodes directly, without a compact tree in between.
+	 * @param source - the source code to parse
+	 * @return an AST representation of the source code
+	 */
+	@Override
+	public AST parseSource(CharSequence source) {
+		if (source.length() >= chunkThreshold) {
+			return super.parseSource(source);
+		}
+		ASTBuilder tree = new ASTBuilder(source);
+		parseRange(source, 0, source.length(), tree);
+		return tree.toAST(this);
+	}
 	
 	/**
-	 * Parses the given file into an AST
-	 * @param filename - the filename of the file to parse
-	 * @return an AST representation of the file's source code
-	 * @throws IOException if there is an error reading the file
+	 * Parses the given source code into a compact tree
+	 * @param source - the source code to parse
+	 * @return a CompactAST representation of the source code
 	 */
-	public AST parse(String filename) throws IOException {
-		BufferedReader br = new BufferedReader(new FileReader(new File(filename)));
+	public CompactAST parseCompact(CharSequence source) {
+		if (source.length() >= chunkThreshold) {
+			return parseChunks(source);
+		}
+		return parseRange(source, 0, source.length()).tree;
+	}
+	
+	@Override
+	public int version() {
+		return VERSION;
+	}
+	
+	// parses the tokens that start in source[start, end) into a compact tree of their own
+	// start must be the start of a token whose parent is the root
+	private static Chunk parseRange(CharSequence source, int start, int end) {
+		CompactAST tree = new CompactAST(source);
+		return new Chunk(start, parseRange(source, start, end, tree), tree);
+	}
+	
+	// adds the tokens that start in source[start, end) to an empty tree, and returns
+	// where the last of them ends
+	private static int parseRange(CharSequence source, int start, int end, TreeBuilder tree) {
+		PythonLexer lexer = new PythonLexer(source, start);
 		
 		// holds onto current parents
-		Stack<ASTNode> parentStack = new Stack<>();
+		int[] parentStack = new int[16];
+		int depth = 0;
 		
 		// initialize tree
-		ASTNode root = new ASTNode();
-		parentStack.push(root);
+		int root = tree.add(-1, ASTNode.Type.ROOT, -1, "@root", -1);
+		parentStack[depth++] = root;
 		
-		ASTNode prev = null;
+		int prev = -1;
 	    
-		// convert all tokens into ASTNodes
-		String token;
+		// convert all tokens into nodes
 		int id = -1;
 		
-		while ((token = getNextToken(br)) != null) {			
-			int indentation = getIndentation(token);
-			String content = token.trim();
+		while (lexer.getPosition() < end && lexer.next()) {
+			int indentation = getIndentation(source, lexer.getStart(), lexer.getEnd());
+			CharSequence content = getContent(source, lexer);
 			ASTNode.Type type = getType(content);
-
-			ASTNode node = new ASTNode(type, content, indentation);
-			node.setID(id--);
 			
 			// if this is a whitespace node, give it the same parent
 			// as the most recently added node
 			if (type == ASTNode.Type.WHITESPACE) {
-				if (prev != null) {
-					prev.getParent().addChild(node);
-				} else {
-					root.addChild(node);
-				}
+				tree.add(prev >= 0 ? tree.getParent(prev) : root, type, indentation, content, id--);
 				continue;
 			}
 			// find parent of this node and add it as a child
-			ASTNode parent = parentStack.peek();
-			while (indentation <= parent.getIndentation()){
-				parentStack.pop();
-				parent = parentStack.peek();
+			while (indentation <= tree.getIndentation(parentStack[depth - 1])) {
+				depth--;
 			}
-			parent.addChild(node);
+			int node = tree.add(parentStack[depth - 1], type, indentation, content, id--);
 			
 			// next lines "should" be children
-			if (content.endsWith(":")) {
-				parentStack.push(node);
+			if (endsWith(content, ":")) {
+				if (depth == parentStack.length) parentStack = Arrays.copyOf(parentStack, depth * 2);
+				parentStack[depth++] = node;
 			}
 			prev = node;
 		}
-		return new AST(root, this);
+		return lexer.getPosition();
 	}
 	
-	/**
-	 * Unparses the given AST back into source code
-	 * @param tree - the AST to be unparsed
-	 * @return a String representation of source code
-	 */
-	public String unparse(AST tree) {
-		StringBuilder sb = new StringBuilder();
-		for (ASTNode child : tree.getRoot().children()) {
-			unparse(child, sb);
+	// parses source in chunks that start at top-level statements, in parallel.
+	// A line that starts at column 0 usually starts a token whose parent is the root, so
+	// each chunk can be parsed without knowing what came before it. Whether a boundary
+	// really was the start of a token (and not, say, a line inside a docstring) is only
+	// known once the chunk before it is lexed: its last token then ends exactly there.
+	private static CompactAST parseChunks(CharSequence source) {
+		int[] bounds = chunkBounds(source, Math.max(2, Runtime.getRuntime().availableProcessors()));
+		List<Callable<Chunk>> tasks = new ArrayList<>();
+		for (int i = 0; i + 1 < bounds.length; i++) {
+			int start = bounds[i];
+			int end = bounds[i + 1];
+			tasks.add(() -> parseRange(source, start, end));
+		}
+		List<Chunk> chunks = new ArrayList<>();
+		try {
+			for (Future<Chunk> future : ForkJoinPool.commonPool().invokeAll(tasks)) {
+				chunks.add(future.get());
+			}
+		} catch (InterruptedException e) {
+			Thread.currentThread().interrupt();
+			throw new IllegalStateException("interrupted while parsing", e);
+		} catch (ExecutionException e) {
+			Throwable cause = e.getCause();
+			if (cause instanceof RuntimeException) throw (RuntimeException) cause;
+			if (cause instanceof Error) throw (Error) cause;
+			throw new IllegalStateException(cause);
 		}
 		
-		return sb.toString();
+		// keep the chunks that start where the previous one stopped; a chunk whose
+		// boundary fell inside a token is parsed again together with the previous one
+		List<Chunk> valid = new ArrayList<>();
+		for (int i = 0; i < chunks.size(); i++) {
+			Chunk chunk = chunks.get(i);
+			Chunk last = valid.isEmpty() ? null : valid.get(valid.size() - 1);
+			if (last == null || last.stop == chunk.start) {
+				valid.add(chunk);
+			} else if (last.stop < bounds[i + 1]) {
+				valid.set(valid.size() - 1, parseRange(source, last.start, bounds[i + 1]));
+			}
+			// otherwise the last token of the previous chunk covers this whole chunk
+		}
+		
+		// stitch the chunks together under one root, numbering their
+		// tokens as if they had all been lexed in one pass
+		CompactAST tree = new CompactAST(source);
+		int root = tree.add(-1, ASTNode.Type.ROOT, -1, "@root", -1);
+		int tokens = 0;
+		for (Chunk chunk : valid) {
+			tree.addSubtrees(root, chunk.tree, -tokens);
+			tokens += chunk.tree.size() - 1;
+		}
+		return tree;
 	}
 	
-	// recursively unparse a subtree
-	public void unparse(ASTNode node, StringBuilder sb) {
-		sb.append(indent(node.getIndentation()));
-		sb.append(node.getContent() + "\n");
-		for (ASTNode child : node.children()) {
-			unparse(child, sb);
+	// returns the starts of about n chunks of source, followed by source.length()
+	private static int[] chunkBounds(CharSequence source, int n) {
+		int length = source.length();
+		int[] bounds = new int[n + 1];
+		int count = 1;
+		for (int k = 1; k < n; k++) {
+			int i = Math.max((int) ((long) length * k / n), bounds[count - 1]);
+			i = nextTopLevelLine(source, i);
+			if (i >= length) break;
+			bounds[count++] = i;
 		}
+		bounds[count++] = length;
+		return Arrays.copyOf(bounds, count);
 	}
 	
-	// read the next token
-	private String getNextToken(BufferedReader br) throws IOException {
-		String token = br.readLine();
-		if (token == null || token.trim().startsWith("#")) return token;
-		
-		int index = 0;
-		Stack<String> subtokens = new Stack<>();
+	// returns the start of the first line after the one containing i that begins
+	// with a statement at column 0, or source.length() if there is none
+	private static int nextTopLevelLine(CharSequence source, int i) {
+		int length = source.length();
+		while (i < length) {
+			while (i < length && source.charAt(i) != '\n' && source.charAt(i) != '\r') i++;
+			while (i < length && (source.charAt(i) == '\n' || source.charAt(i) == '\r')) i++;
+			// closing brackets at column 0 end an expression rather than start a statement
+			if (i < length && source.charAt(i) > ' ' && ")]}".indexOf(source.charAt(i)) < 0) return i;
+		}
+		return length;
+	}
+	
+	// the tree of the tokens starting in source[start, stop)
+	private static class Chunk {
+		final int start;
+		final int stop;
+		final CompactAST tree;
 		
-		outerloop:
-		while (index < token.length() || !subtokens.isEmpty()) {
-			// add another line if needed
-			if (index == token.length() || token.trim().endsWith("\\")) {
-				String temp = br.readLine();
-				if (temp != null) {
-					token += "\n" + temp;
-				}
-			}
-			
-			String part = token.substring(index);
-			
-			// check for a closing character
-			if (!subtokens.isEmpty()) {
-				String close = closing(subtokens.peek());
-				if (part.startsWith(close) && token.charAt(index - 1) != '\\') {
-					subtokens.pop();
-					index += close.length();
-					continue;
-				}
-			}
-						
-			// check for an opening character if not in a string currently
-			if (subtokens.isEmpty() || !isString(subtokens.peek())) {
-				for (int i = 0; i < opens.length; i++) {
-					if (part.startsWith(opens[i])) {
-						subtokens.push(opens[i]);
-						index += opens[i].length();
-						continue outerloop;
-					}
-				}
-			}
-			index++;
-		}		
-		return token;
+		Chunk(int start, int stop, CompactAST tree) {
+			this.start = start;
+			this.stop = stop;
+			this.tree = tree;
+		}
+	}
+	
+	/**
+	 * Unparses the given AST back into source code, writing it to out
+	 * @param tree - the AST to be unparsed
+	 * @param out - to write the source code to
+	 * @throws IOException if out throws one
+	 */
+	public void unparse(AST tree, Appendable out) throws IOException {
+		for (ASTNode child : tree.getRoot().children()) {
+			unparse(child, out);
+		}
 	}
 	
+	// recursively unparse a subtree, copying the text of unchanged subtrees from the source
+	public void unparse(ASTNode node, Appendable out) throws IOException {
+		CharSequence text = node.getSourceText();
+		if (text != null) {
+			SourceSlice.write(out, text, 0, text.length());
+			return;
+		}
+		writeIndent(out, node.getIndentation());
+		SourceSlice.write(out, node.content(), 0, node.content().length());
+		out.append('\n');
+		for (ASTNode child : node.children()) {
+			unparse(child, out);
+		}
+	}
 	
-	// returns the number of spaces at the beginning of line (tabs = 4 spaces)
-	private static int getIndentation(String line) {
+	// returns the number of spaces at the beginning of the token source[start, end) (tabs = 4 spaces)
+	private static int getIndentation(CharSequence source, int start, int end) {
 		int indentation = 0;
-		int index = 0;
 		boolean tab = false;
-		while (line.startsWith(" ", index) ||
-			   (tab = line.startsWith("\t", index))) {
+		for (int i = start; i < end; i++) {
+			char c = source.charAt(i);
+			if (c == '\t') {
+				tab = true;
+			} else if (c != ' ') {
+				break;
+			}
 			indentation += tab ? 4 : 1;
-			index++;
 		}
 		return indentation;
 	}
 	
+	// returns the trimmed current token as a slice of the source, or as a String
+	// if its line breaks have to be normalized
+	private static CharSequence getContent(CharSequence source, PythonLexer lexer) {
+		int start = lexer.getStart();
+		int end = lexer.getEnd();
+		while (start < end && source.charAt(start) <= ' ') start++;
+		while (end > start && source.charAt(end - 1) <= ' ') end--;
+		for (int i = start; i < end; i++) {
+			if (source.charAt(i) == '\r') return lexer.getToken().trim();
+		}
+		return new SourceSlice(source, start, end - start);
+	}
+	
 	// determines the type of the node given the content
-	private static ASTNode.Type getType(String lineContent) {
-		if (lineContent.startsWith("def")) {
+	private static ASTNode.Type getType(CharSequence lineContent) {
+		if (startsWith(lineContent, "def")) {
 			return ASTNode.Type.METHOD;
-		} else if (lineContent.startsWith("if")) {
+		} else if (startsWith(lineContent, "if")) {
 		    return ASTNode.Type.IF_STATEMENT;
-		} else if (lineContent.startsWith("while")) {
+		} else if (startsWith(lineContent, "while")) {
 			return ASTNode.Type.WHILE_LOOP;
-		} else if (lineContent.startsWith("for")) {
+		} else if (startsWith(lineContent, "for")) {
 			return ASTNode.Type.FOR_LOOP;
-		} else if (lineContent.startsWith("return")) {
+		} else if (startsWith(lineContent, "return")) {
 			return ASTNode.Type.RETURN;
-		} else if (lineContent.startsWith("import") || lineContent.startsWith("from")) {
+		} else if (startsWith(lineContent, "import") || startsWith(lineContent, "from")) {
 			return ASTNode.Type.IMPORT;
-		} else if (lineContent.startsWith("#")) {
+		} else if (startsWith(lineContent, "#")) {
 			return ASTNode.Type.COMMENT;
-		} else if (lineContent.startsWith("\"\"\"") && lineContent.endsWith("\"\"\"")) {
+		} else if (startsWith(lineContent, "\"\"\"") && endsWith(lineContent, "\"\"\"")) {
 			return ASTNode.Type.BLOCK_COMMENT;
-		} else if (lineContent.isEmpty()) {
+		} else if (lineContent.length() == 0) {
 			return ASTNode.Type.WHITESPACE;
-		} else if (lineContent.contains(" = ")) {
+		} else if (contains(lineContent, " = ")) {
 			return ASTNode.Type.ASSIGNMENT;
 		}
 		return null;
 	}
 	
-	// returns the closing character that matches the given opening character
-	// example: "(" -> ")"
-	private static String closing(String open) {
-		return closes[Arrays.asList(opens).indexOf(open)];
+	// String.startsWith for CharSequences
+	private static boolean startsWith(CharSequence s, String prefix) {
+		return regionMatches(s, 0, prefix);
+	}
+	
+	// String.endsWith for CharSequences
+	private static boolean endsWith(CharSequence s, String suffix) {
+		return regionMatches(s, s.length() - suffix.length(), suffix);
 	}
 	
-	// returns if the given opening/closing character is a string type
-	private static boolean isString(String s) {
-		return s.equals("\"\"\"") || s.equals("'''") || s.equals("\"") || s.equals("'");
+	// String.contains for CharSequences
+	private static boolean contains(CharSequence s, String part) {
+		for (int i = 0; i + part.length() <= s.length(); i++) {
+			if (regionMatches(s, i, part)) return true;
+		}
+		return false;
+	}
+	
+	// returns true iff part occurs in s at the given offset
+	private static boolean regionMatches(CharSequence s, int offset, String part) {
+		if (offset < 0 || offset + part.length() > s.length()) return false;
+		for (int i = 0; i < part.length(); i++) {
+			if (s.charAt(offset + i) != part.charAt(i)) return false;
+		}
+		return true;
 	}
 }
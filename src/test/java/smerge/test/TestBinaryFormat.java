@@ -0,0 +1,89 @@
+package smerge.test;
+
+import static org.junit.Assert.*;
+
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
+import java.io.DataInputStream;
+import java.io.DataOutputStream;
+import java.io.EOFException;
+import java.io.IOException;
+import java.util.Arrays;
+
+import org.junit.Test;
+
+import smerge.actions.ActionSet;
+import smerge.ast.AST;
+import smerge.ast.BinaryFormat;
+import smerge.diff.Differ;
+import smerge.parsers.PythonParser;
+
+public class TestBinaryFormat {
+
+	public static final String BASE = "conflicts/test/test_base.py";
+	public static final String LOCAL = "conflicts/test/test_local.py";
+	public static final String REMOTE = "conflicts/test/test_remote.py";
+
+	@Test
+	public void TestAST() throws IOException {
+		PythonParser parser = new PythonParser();
+		AST tree = parser.parse(BASE);
+
+		ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+		tree.write(new DataOutputStream(bytes));
+		AST copy = AST.read(new DataInputStream(new ByteArrayInputStream(bytes.toByteArray())), parser);
+
+		assertEquals(tree.debugTree(), copy.debugTree());
+		assertEquals(tree.toString(), copy.toString());
+	}
+
+	@Test
+	public void TestActionSet() throws IOException {
+		PythonParser parser = new PythonParser();
+		AST base = parser.parse(BASE);
+		AST local = parser.parse(LOCAL);
+		AST remote = parser.parse(REMOTE);
+		ActionSet localActions = new ActionSet();
+		ActionSet remoteActions = new ActionSet();
+		new Differ(base, local, remote).diff(localActions, remoteActions);
+
+		ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+		localActions.write(new DataOutputStream(bytes));
+		ActionSet copy = ActionSet.read(new DataInputStream(new ByteArrayInputStream(bytes.toByteArray())), base, local);
+
+		assertEquals(sorted(localActions.toString()), sorted(copy.toString()));
+		assertEquals(localActions.parents(), copy.parents());
+	}
+
+	@Test(expected = IOException.class)
+	public void TestBadHeader() throws IOException {
+		byte[] bytes = {0, 0, 0, 0, 0, 0, 0, 1};
+		AST.read(new DataInputStream(new ByteArrayInputStream(bytes)), new PythonParser());
+	}
+
+	@Test
+	public void TestCorruptLength() throws IOException {
+		// blocks claiming far more values than there are run out of data, without first
+		// allocating arrays of the claimed length
+		byte[] ints = {0x1f, -1, -1, -16, 0, 0, 0, 1};
+		try {
+			BinaryFormat.readInts(new DataInputStream(new ByteArrayInputStream(ints)));
+			fail("read a block past the end of the data");
+		} catch (EOFException e) {
+			// expected
+		}
+		byte[] bytes = {0x7f, -1, -1, -16, 1, 2, 3};
+		try {
+			BinaryFormat.readBytes(new DataInputStream(new ByteArrayInputStream(bytes)));
+			fail("read a block past the end of the data");
+		} catch (EOFException e) {
+			// expected
+		}
+	}
+
+	private static String sorted(String lines) {
+		String[] split = lines.split("\n");
+		Arrays.sort(split);
+		return String.join("\n", split);
+	}
+}
@@ -0,0 +1,77 @@
+package smerge.test;
+
+import static org.junit.Assert.*;
+
+import java.io.File;
+import java.io.IOException;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+
+import org.junit.Test;
+
+import smerge.diff.AdaptiveKernel;
+import smerge.diff.BandedKernel;
+import smerge.diff.BlockMyersKernel;
+import smerge.diff.DistanceKernel;
+import smerge.diff.LevenshteinKernel;
+import smerge.diff.MyersKernel;
+
+public class TestDistanceKernels {
+
+	public static final String CORPUS = "scripts/test_results";
+
+	@Test
+	public void TestSmall() {
+		DistanceKernel[] kernels = kernels();
+		String[][] pairs = {{"", ""}, {"", "abc"}, {"kitten", "sitting"}, {"x = 1", "x = 1"}, {"ab\u00e9", "\u00e9ab"}};
+		int[] expected = {0, 3, 3, 0, 2};
+		for (int i = 0; i < pairs.length; i++) {
+			for (DistanceKernel kernel : kernels) {
+				assertEquals(expected[i], distance(kernel, pairs[i][0], pairs[i][1], 100));
+			}
+		}
+	}
+
+	@Test
+	public void TestCorpus() throws IOException {
+		DistanceKernel reference = new LevenshteinKernel();
+		DistanceKernel[] kernels = kernels();
+		int pairs = 0;
+		for (File project : new File(CORPUS).listFiles()) {
+			File[] files = new File(project, "files").listFiles();
+			if (files == null) continue;
+			for (File file : files) {
+				String[] lines = new String(Files.readAllBytes(file.toPath()), StandardCharsets.UTF_8).split("\n");
+				for (int i = 0; i + 1 < lines.length; i++) {
+					String a = lines[i];
+					String b = lines[i + 1];
+					int expected = distance(reference, a, b, Integer.MAX_VALUE);
+					int maxLength = Math.max(a.length(), b.length());
+					for (int limit : new int[] {maxLength, maxLength / 5}) {
+						for (DistanceKernel kernel : kernels) {
+							if (kernel instanceof MyersKernel && Math.min(a.length(), b.length()) > MyersKernel.MAX_LENGTH) {
+								continue;
+							}
+							int actual = distance(kernel, a, b, limit);
+							if (expected <= limit) {
+								assertEquals(kernel.getClass().getSimpleName() + ": " + a + " / " + b, expected, actual);
+							} else {
+								assertTrue(kernel.getClass().getSimpleName() + ": " + a + " / " + b, actual > limit);
+							}
+						}
+					}
+					pairs++;
+				}
+			}
+		}
+		assertTrue(pairs > 0);
+	}
+
+	private static DistanceKernel[] kernels() {
+		return new DistanceKernel[] {new MyersKernel(), new BlockMyersKernel(), new BandedKernel(), new AdaptiveKernel()};
+	}
+
+	private static int distance(DistanceKernel kernel, String a, String b, int limit) {
+		return kernel.distance(a.toCharArray(), a.length(), b.toCharArray(), b.length(), limit);
+	}
+}
@@ -0,0 +1,198 @@
+package smerge.test;
+
+import static org.junit.Assert.*;
+
+import java.io.File;
+import java.io.IOException;
+import java.util.Iterator;
+
+import org.junit.Test;
+
+import smerge.ast.AST;
+import smerge.ast.ASTNode;
+import smerge.diff.Match;
+import smerge.diff.MatchTable;
+import smerge.diff.Matcher;
+import smerge.parsers.PythonParser;
+
+public class TestMatcher {
+
+	@Test
+	public void TestIdenticalLines() {
+		PythonParser parser = new PythonParser();
+		AST base = parser.parseSource("def f():\n    return 1\ndef g():\n    return 1\n");
+		AST local = parser.parseSource("def g():\n    return 1\ndef f():\n    return 1\n");
+		AST remote = parser.parseSource("def f():\n    return 1\ndef g():\n    return 1\n");
+		Matcher matcher = new Matcher(base, local, remote);
+
+		// every line is identical to a base line, so no new matches are made
+		assertEquals(5, matcher.matches().size());
+
+		// identical lines go to the base line under the matching parent
+		for (ASTNode header : local.getRoot().children()) {
+			Match match = matcher.matches().get(header.children().get(0).getID());
+			assertEquals(header.getContent(), match.getBaseNode().getParent().getContent());
+		}
+	}
+	
+	@Test
+	public void TestSimilarLines() {
+		PythonParser parser = new PythonParser();
+		AST base = parser.parseSource("total = compute_total(values, weights)\nx = 1\nprint(total)\n");
+		AST local = parser.parseSource("print(total)\ntotal = compute_total(values, weight)\ny = 2\n");
+		Matcher matcher = new Matcher(base, local, parser.parseSource(""));
+		
+		// the edited line is matched to the base line it came from, the new one isn't
+		ASTNode edited = local.getRoot().children().get(1);
+		assertEquals("total = compute_total(values, weights)",
+				matcher.matches().get(edited.getID()).getBaseNode().getContent());
+		assertNull(matcher.matches().get(local.getRoot().children().get(2).getID()).getBaseNode());
+	}
+	
+	@Test
+	public void TestMovedSubtree() {
+		PythonParser parser = new PythonParser();
+		AST base = parser.parseSource("def f():\n    x = 1\n    return x\ny = 2\n");
+		AST local = parser.parseSource("y = 2\nclass A:\n    def f():\n        x = 1\n        return x\n");
+		ASTNode moved = local.getRoot().children().get(1).children().get(0);
+		assertEquals(base.getRoot().children().get(0).subtreeHash(), moved.subtreeHash());
+		
+		// the whole method is matched where it moved to
+		Matcher matcher = new Matcher(base, local, parser.parseSource(""));
+		for (Iterator<ASTNode> nodes = moved.preOrder(); nodes.hasNext(); ) {
+			ASTNode node = nodes.next();
+			assertEquals(node.getContent(), matcher.matches().get(node.getID()).getBaseNode().getContent());
+		}
+		
+		// changing a node changes the hashes of the subtrees containing it
+		int hash = moved.subtreeHash();
+		moved.children().get(1).setContent("return 2");
+		assertNotEquals(hash, moved.subtreeHash());
+	}
+	
+	@Test
+	public void TestScoped() {
+		PythonParser parser = new PythonParser();
+		String base = "def f():\n    value = compute(a, b, c)\ndef g():\n    value = compute(a, b, cd)\n";
+		String local = "def g():\n    return\ndef f():\n    value = compute(a, b, c, d)\n";
+		
+		// the edited line is closer to the line in g, but is matched to the one in f, where it stayed
+		for (boolean scoped : new boolean[] {true, false}) {
+			AST localTree = parser.parseSource(local);
+			Matcher matcher = new Matcher(parser.parseSource(base), localTree, parser.parseSource(""), scoped);
+			ASTNode edited = localTree.getRoot().children().get(1).children().get(0);
+			ASTNode parent = matcher.matches().get(edited.getID()).getBaseNode().getParent();
+			assertEquals(scoped ? "def f():" : "def g():", parent.getContent());
+		}
+	}
+	
+	@Test
+	public void TestAnchors() {
+		PythonParser parser = new PythonParser();
+		AST base = parser.parseSource("a = 0\nx = 1\nb = 0\nx = 1\n");
+		AST local = parser.parseSource("b = 0\nx = 1\n");
+		Matcher matcher = new Matcher(base, local, parser.parseSource(""));
+		
+		// the repeated line is matched to the copy that follows the line before it, like a line diff would
+		ASTNode x = local.getRoot().children().get(1);
+		assertSame(base.getRoot().children().get(3), matcher.matches().get(x.getID()).getBaseNode());
+	}
+	
+	@Test
+	public void TestDistanceMemo() {
+		PythonParser parser = new PythonParser();
+		// lines too long to be compared in one word, which are memoized
+		String line = "total = compute_total(values, weights, offsets, scale=scale, axis=axis)";
+		AST base = parser.parseSource(line + "\n");
+		AST local = parser.parseSource(line.replace("weights", "weight") + "\n");
+		AST remote = parser.parseSource(line.replace("weights", "weight") + "\n");
+		Matcher matcher = new Matcher(base, local, remote, true, false);
+		
+		// the remote line is compared with the base line by the local pass already
+		// (in parallel, both passes may look it up before either has computed it)
+		assertEquals(1, matcher.distanceMemo().misses());
+		assertEquals(1, matcher.distanceMemo().hits());
+		assertEquals(1, matcher.distanceMemo().size());
+		assertEquals(local.getRoot().children().get(0).getID(), remote.getRoot().children().get(0).getID());
+	}
+	
+	@Test
+	public void TestMatchTable() {
+		PythonParser parser = new PythonParser();
+		AST base = parser.parseSource("x = 1\ny = 2\n");
+		AST local = parser.parseSource("x = 1\nz = 3\n");
+		AST remote = parser.parseSource("w = 4\ny = 2\n");
+		MatchTable matches = new Matcher(base, local, remote).matches();
+		
+		// base nodes come first, then the new local and remote nodes
+		assertEquals(5, matches.size());
+		assertSame(base.getRoot().children().get(1), matches.getBaseNode(2));
+		assertNull(matches.getLocalNode(2));
+		assertSame(local.getRoot().children().get(1), matches.getLocalNode(3));
+		assertSame(remote.getRoot().children().get(0), matches.getRemoteNode(4));
+		
+		// a Match reads through to the table
+		Match match = matches.get(1);
+		assertSame(matches.getBaseNode(1), match.getBaseNode());
+		assertSame(local.getRoot().children().get(0), match.getLocalNode());
+		assertNull(match.getRemoteNode());
+	}
+	
+	@Test
+	public void TestParallel() throws IOException {
+		PythonParser parser = new PythonParser();
+		File[] files = new File(TestDistanceKernels.CORPUS, "flask_test_results/files").listFiles();
+		int conflicts = 0;
+		for (File file : files) {
+			String name = file.getPath();
+			if (!name.endsWith("_base.py")) continue;
+			String prefix = name.substring(0, name.length() - "base.py".length());
+			
+			// matching in parallel gives every node the id matching serially does
+			String[] trees = new String[4];
+			for (int i = 0; i < 2; i++) {
+				AST base = parser.parse(name);
+				AST local = parser.parse(prefix + "local.py");
+				AST remote = parser.parse(prefix + "remote.py");
+				new Matcher(base, local, remote, true, i == 1);
+				trees[2 * i] = local.debugTree();
+				trees[2 * i + 1] = remote.debugTree();
+			}
+			assertEquals(trees[0], trees[2]);
+			assertEquals(trees[1], trees[3]);
+			conflicts++;
+		}
+		assertTrue(conflicts > 0);
+	}
+	
+	@Test
+	public void TestRegions() {
+		// enough edited lines to be matched by region, one region per function
+		StringBuilder base = new StringBuilder();
+		StringBuilder local = new StringBuilder();
+		for (int i = 0; i < 100; i++) {
+			base.append("def f" + i + "():\n");
+			local.append("def f" + i + "():\n");
+			for (int j = 0; j < 12; j++) {
+				base.append("    value_" + j + " = compute(alpha, beta, " + j + ")\n");
+				local.append("    value_" + j + " = compute(alpha, beta, " + j + ", 1)\n");
+			}
+		}
+		
+		PythonParser parser = new PythonParser();
+		String[] trees = new String[2];
+		for (int i = 0; i < 2; i++) {
+			AST localTree = parser.parseSource(local);
+			Matcher matcher = new Matcher(parser.parseSource(base), localTree, parser.parseSource(""), true, i == 1);
+			for (ASTNode header : localTree.getRoot().children()) {
+				for (ASTNode line : header.children()) {
+					ASTNode match = matcher.matches().get(line.getID()).getBaseNode();
+					assertEquals(header.getContent(), match.getParent().getContent());
+					assertEquals(line.getContent().replace(", 1)", ")"), match.getContent());
+				}
+			}
+			trees[i] = localTree.debugTree();
+		}
+		assertEquals(trees[0], trees[1]);
+	}
+}
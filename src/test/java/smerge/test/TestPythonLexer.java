@@ -0,0 +1,65 @@
+package smerge.test;
+
+import static org.junit.Assert.*;
+
+import java.util.ArrayList;
+import java.util.List;
+
+import org.junit.Test;
+
+import smerge.parsers.PythonLexer;
+
+public class TestPythonLexer {
+
+	@Test
+	public void TestLines() {
+		assertEquals(list("x = 1", "", "    y = 2"), tokens("x = 1\n\n    y = 2\n"));
+		assertEquals(list("x = 1", "y = 2"), tokens("x = 1\r\ny = 2"));
+	}
+
+	@Test
+	public void TestBrackets() {
+		assertEquals(list("x = foo(a,\n    b)", "y = 2"), tokens("x = foo(a,\n    b)\ny = 2\n"));
+		assertEquals(list("d = {\n  'a': [1,\n 2],\n}", "z"), tokens("d = {\n  'a': [1,\n 2],\n}\nz\n"));
+	}
+
+	@Test
+	public void TestStrings() {
+		assertEquals(list("s = \"\"\"doc\n(\nstring\"\"\"", "x"), tokens("s = \"\"\"doc\n(\nstring\"\"\"\nx\n"));
+		assertEquals(list("s = '\\\\'", "x = (1)"), tokens("s = '\\\\'\nx = (1)\n"));
+		assertEquals(list("s = r'\\'('", "x"), tokens("s = r'\\'('\nx\n"));
+		assertEquals(list("s = f\"{d['(']}\"", "x"), tokens("s = f\"{d['(']}\"\nx\n"));
+		assertEquals(list("s = f'{x:{w}}' + '{'", "x"), tokens("s = f'{x:{w}}' + '{'\nx\n"));
+	}
+
+	@Test
+	public void TestComments() {
+		assertEquals(list("x = 1  # don't (", "y = 2"), tokens("x = 1  # don't (\ny = 2\n"));
+		assertEquals(list("# comment \\", "y = 2"), tokens("# comment \\\ny = 2\n"));
+	}
+
+	@Test
+	public void TestContinuation() {
+		assertEquals(list("x = 1 + \\\n    2", "y"), tokens("x = 1 + \\\n    2\ny\n"));
+	}
+
+	@Test
+	public void TestUnclosed() {
+		assertEquals(list("x = foo(\ny = 2"), tokens("x = foo(\ny = 2\n"));
+	}
+
+	private static List<String> tokens(String source) {
+		List<String> tokens = new ArrayList<>();
+		PythonLexer lexer = new PythonLexer(source);
+		while (lexer.next()) {
+			tokens.add(lexer.getToken());
+		}
+		return tokens;
+	}
+
+	private static List<String> list(String... tokens) {
+		List<String> list = new ArrayList<>();
+		for (String token : tokens) list.add(token);
+		return list;
+	}
+}
@@ -2,13 +2,27 @@ package smerge.test;
 
 import static org.junit.Assert.*;
 
+import java.io.ByteArrayInputStream;
+import java.io.ByteArrayOutputStream;
 import java.io.File;
 import java.io.FileInputStream;
 import java.io.IOException;
+import java.io.StringWriter;
+import java.nio.ByteBuffer;
+import java.nio.channels.Channels;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.NoSuchFileException;
+import java.nio.file.Path;
+import java.util.Iterator;
+import java.util.List;
 
 import org.junit.Test;
 
 import smerge.ast.AST;
+import smerge.ast.ASTNode;
+import smerge.ast.CompactAST;
+import smerge.parsers.ParseCache;
 import smerge.parsers.PythonParser;
 
 public class TestPythonParser {
@@ -28,6 +42,203 @@ public class TestPythonParser {
 		
 	}
 	
+	@Test
+	public void TestInMemory() throws IOException {
+		String fileContent = readFile(new File(SIMPLE));
+		byte[] bytes = fileContent.getBytes(StandardCharsets.UTF_8);
+		PythonParser parser = new PythonParser();
+		String expected = parser.parse(SIMPLE).toString();
+		
+		assertEquals(expected, parser.parseSource(fileContent).toString());
+		assertEquals(expected, parser.parse(bytes, StandardCharsets.UTF_8).toString());
+		assertEquals(expected, parser.parse(Channels.newChannel(new ByteArrayInputStream(bytes)),
+				StandardCharsets.UTF_8).toString());
+		assertEquals(expected, parser.parseMapped(SIMPLE).toString());
+	}
+	
+	@Test
+	public void TestParseAll() throws IOException {
+		String base = "conflicts/test/test_base.py";
+		String local = "conflicts/test/test_local.py";
+		PythonParser parser = new PythonParser();
+		
+		// the trees come back in argument order, the same as parsing one file at a time
+		AST[] trees = parser.parseAll(base, local, SIMPLE);
+		assertEquals(3, trees.length);
+		assertEquals(parser.parse(base).debugTree(), trees[0].debugTree());
+		assertEquals(parser.parse(local).debugTree(), trees[1].debugTree());
+		assertEquals(parser.parse(SIMPLE).debugTree(), trees[2].debugTree());
+		
+		// errors reading a file reach the caller as they were thrown
+		try {
+			parser.parseAll(base, "conflicts/test/missing.py", SIMPLE);
+			fail("parsed a missing file");
+		} catch (NoSuchFileException e) {
+			assertEquals("conflicts/test/missing.py", e.getFile());
+		}
+	}
+	
+	@Test
+	public void TestCompact() throws IOException {
+		PythonParser parser = new PythonParser();
+		AST tree = parser.parse(SIMPLE);
+		CompactAST compact = CompactAST.of(tree);
+		
+		assertEquals(tree.debugTree(), compact.toAST(parser).debugTree());
+		assertEquals(ASTNode.Type.ROOT, compact.getType(0));
+		assertEquals(-1, compact.getParent(0));
+		
+		// trees built directly find the same source text as trees built from compact ones
+		Iterator<ASTNode> built = compact.toAST(parser).iterator();
+		for (ASTNode node : tree) {
+			assertEquals(String.valueOf(node.getSourceText()), String.valueOf(built.next().getSourceText()));
+		}
+	}
+	
+	@Test
+	public void TestChunked() throws IOException {
+		PythonParser serial = new PythonParser();
+		PythonParser chunked = new PythonParser(0);
+		
+		String big = "scripts/test_results/keras_test_results/files/3_topology_base.py";
+		assertEquals(serial.parse(big).debugTree(), chunked.parse(big).debugTree());
+		
+		// lines at column 0 that are not the start of a statement
+		String source = "def f():\n    s = \"\"\"\ndoc\nstring\n\"\"\"\n\n    return (1,\n2)\nx = 1\n";
+		for (int i = 0; i < 5; i++) source += source;
+		assertEquals(serial.parseSource(source).debugTree(), chunked.parseSource(source).debugTree());
+	}
+	
+	@Test
+	public void TestCache() throws IOException {
+		assertEquals("ce013625030ba8dba906f756967f9e9ca394464a",
+				ParseCache.blobID(ByteBuffer.wrap("hello\n".getBytes(StandardCharsets.UTF_8))));
+		
+		Path dir = Files.createTempDirectory("smerge-cache");
+		PythonParser parser = new PythonParser();
+		String expected = parser.parse(SIMPLE).debugTree();
+		parser.setCache(new ParseCache(dir, 1 << 20));
+		
+		assertEquals(expected, parser.parse(SIMPLE).debugTree()); // miss
+		assertEquals(1, dir.toFile().list().length);
+		assertEquals(expected, parser.parse(SIMPLE).debugTree()); // hit
+		
+		// storing an entry in a cache too small for any entry evicts everything
+		parser.setCache(new ParseCache(dir, 0));
+		parser.parse(Files.readAllBytes(dir.getFileSystem().getPath(SIMPLE)), StandardCharsets.ISO_8859_1);
+		assertEquals(0, dir.toFile().list().length);
+		Files.delete(dir);
+	}
+	
+	@Test
+	public void TestCacheSharedDir() throws IOException {
+		Path dir = Files.createTempDirectory("smerge-cache");
+		Path notes = Files.write(dir.resolve("notes.txt"), "not an entry\n".getBytes(StandardCharsets.UTF_8));
+		Path writing = Files.write(dir.resolve(ParseCache.blobID(ByteBuffer.allocate(0)) + ".PythonParser.v1.UTF-8123.tmp"),
+				new byte[] {1});
+		
+		// eviction only deletes the cache's own entries, not other files or entries being written
+		PythonParser parser = new PythonParser();
+		parser.setCache(new ParseCache(dir, 0));
+		parser.parse(SIMPLE);
+		assertTrue(Files.exists(notes));
+		assertTrue(Files.exists(writing));
+		assertEquals(2, dir.toFile().list().length);
+		
+		Files.delete(notes);
+		Files.delete(writing);
+		Files.delete(dir);
+	}
+	
+	@Test
+	public void TestStreamingUnparse() throws IOException {
+		PythonParser parser = new PythonParser();
+		AST tree = parser.parse(SIMPLE);
+		String expected = parser.unparse(tree);
+		
+		StringWriter writer = new StringWriter();
+		parser.unparse(tree, writer);
+		assertEquals(expected, writer.toString());
+		
+		ByteArrayOutputStream bytes = new ByteArrayOutputStream();
+		parser.unparse(tree, Channels.newChannel(bytes), StandardCharsets.UTF_8);
+		assertEquals(expected, new String(bytes.toByteArray(), StandardCharsets.UTF_8));
+	}
+	
+	@Test
+	public void TestSplice() throws IOException {
+		PythonParser parser = new PythonParser();
+		String big = "scripts/test_results/keras_test_results/files/3_topology_base.py";
+		AST spliced = parser.parse(big);
+		AST rendered = parser.parse(big);
+		
+		// forget the source text of every node
+		for (ASTNode node : rendered) node.setIndentation(node.getIndentation());
+		assertNull(rendered.getRoot().children().get(0).getSourceText());
+		assertEquals(rendered.toString(), spliced.toString());
+		
+		// change a node deep in the tree
+		ASTNode deep = spliced.getRoot();
+		while (!deep.isLeafNode()) deep = deep.children().get(deep.children().size() - 1);
+		deep.setContent("x = 1");
+		ASTNode copy = rendered.getRoot();
+		while (!copy.isLeafNode()) copy = copy.children().get(copy.children().size() - 1);
+		copy.setContent("x = 1");
+		assertEquals(rendered.toString(), spliced.toString());
+	}
+	
+	@Test
+	public void TestFlattened() throws IOException {
+		PythonParser parser = new PythonParser();
+		AST tree = parser.parse(SIMPLE);
+		
+		// the flattened nodes are in pre-order, with each subtree in one range
+		List<ASTNode> nodes = tree.nodes();
+		Iterator<ASTNode> preOrder = tree.getRoot().preOrder();
+		for (int i = 0; i < nodes.size(); i++) {
+			ASTNode node = preOrder.next();
+			assertSame(node, nodes.get(i));
+			assertEquals(i, tree.indexOf(node));
+			int end = i;
+			for (Iterator<ASTNode> subtree = node.preOrder(); subtree.hasNext(); subtree.next()) end++;
+			assertEquals(end, tree.subtreeEnd(i));
+		}
+		assertFalse(preOrder.hasNext());
+		for (ASTNode.Type type : ASTNode.Type.values()) {
+			for (int i : tree.indicesOf(type)) assertEquals(type, nodes.get(i).getType());
+		}
+		
+		// changing the shape of the tree flattens it again
+		ASTNode block = tree.getRoot().children().get(2);
+		ASTNode added = new ASTNode(ASTNode.Type.RETURN, "return", 4);
+		block.addChild(added);
+		assertEquals(nodes.size() + 1, tree.nodes().size());
+		assertSame(added, tree.nodes().get(tree.subtreeEnd(tree.indexOf(block)) - 1));
+		block.removeChild(added);
+		assertEquals(-1, tree.indexOf(added));
+	}
+	
+	@Test
+	public void TestPositions() {
+		ASTNode root = new ASTNode();
+		for (int i = 0; i < 5; i++) root.addChild(new ASTNode(ASTNode.Type.ASSIGNMENT, "x = " + i, 0));
+		List<ASTNode> children = root.children();
+		
+		// positions follow inserts and removes before them
+		ASTNode inserted = new ASTNode(ASTNode.Type.RETURN, "return", 0);
+		root.insertChild(2, inserted);
+		ASTNode removed = children.get(0);
+		root.removeChild(removed);
+		for (int i = 0; i < children.size(); i++) assertEquals(i, children.get(i).getPosition());
+		assertEquals(1, inserted.getPosition());
+		
+		// nodes are found by identity, not by their (here all equal) ids
+		assertEquals(-1, removed.getPosition());
+		root.children().get(3).addChild(removed);
+		assertEquals(0, removed.getPosition());
+		assertEquals(5, children.size());
+	}
+	
 	 public static String readFile(File file) {
 		    StringBuffer stringBuffer = new StringBuffer();
 		    if (file.exists())